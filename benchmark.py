@@ -0,0 +1,228 @@
+import argparse
+import json
+import random
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+from circuit import circuit, operator_cache
+from dimensions import gate_n_per_line
+from qcs import build_circuit
+
+
+"""
+
+Benchmark suite of the simulator.
+
+Random (seeded) circuits filling all the columns of the GUI are generated for every circuit size and gate mix, and
+the following stages are timed (best of several repeats), with their peak memory (tracemalloc):
+    construction   -> building the 'circuit' object from gate records (what convert_to_simulator does)
+    add_gate       -> adding all the gates to an empty 'circuit'
+    get_state      -> a single measurement (make_measurement on |0...0>)
+    probabilities  -> all 2^n probabilities (get_probabilities)
+
+Results can be saved as a baseline and later runs compared against it, reporting stages whose time or memory grew
+beyond the tolerance (the exit code is then 1):
+
+    python benchmark.py --save                 # store bench_baseline.json
+    python benchmark.py                        # compare against it
+
+"""
+
+simple_gates = ("I", "X", "Y", "Z", "S", "H", "sqrt")
+complex_gates = ("CX", "CY", "CZ", "CH", "CS")
+
+# Gate mixes: (fraction of filled locations, fraction of 'complex' gates among them)
+mixes = {
+    "simple": (0.8, 0.0),
+    "mixed": (0.8, 0.3),
+    "controlled": (0.8, 0.7),
+}
+
+stages = ("construction", "add_gate", "get_state", "probabilities")
+
+default_baseline = "bench_baseline.json"
+
+
+def random_records(size: int, mix: str, seed: int = 0) -> list:
+    """
+    Random gate records filling the gate_n_per_line columns of a circuit
+
+    :param size: circuit size
+    :param mix: gate mix name (see mixes)
+    :param seed: random seed
+    :return: list of (gate name, column, target, control)
+    """
+
+    fill, controlled = mixes[mix]
+    rng = random.Random(seed)
+    records = []
+
+    for column in range(gate_n_per_line):
+        free = list(range(size))
+        rng.shuffle(free)
+
+        while free:
+            line = free.pop()
+            if rng.random() > fill:
+                continue
+
+            if free and rng.random() < controlled:
+                records.append((rng.choice(complex_gates), column, line, free.pop()))
+            else:
+                records.append((rng.choice(simple_gates), column, line, None))
+
+    return records
+
+
+def measure(function, repeat: int, setup=None) -> tuple:
+    """ (best wall time in s, peak memory in bytes) of a function, setup being called (untimed) before each run """
+
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def run_case(size: int, mix: str, backend: str, repeat: int) -> dict:
+    """ Time all stages for one circuit size and gate mix """
+
+    records = random_records(size, mix, seed=size)
+    CIRCUIT = build_circuit(size, records, backend=backend)
+    # The 'simple' mix is all Clifford gates, time the backend kernels rather than the stabilizer tableau
+    CIRCUIT.stabilizer_dispatch = False
+
+    def add_gates():
+        empty = circuit(size, backend=backend)
+        for gate, index, column in CIRCUIT.operations:
+            empty.add_gate(gate, index, column)
+
+    bra = np.zeros(2 ** size)
+    bra[0] = 1
+
+    functions = {
+        "construction": lambda: build_circuit(size, records, backend=backend),
+        "add_gate": add_gates,
+        "get_state": lambda: CIRCUIT.make_measurement(bra),
+        "probabilities": lambda: CIRCUIT.get_probabilities(),
+    }
+
+    # Column operators ('dense' backend) are cached between runs, always time them from scratch
+    setup = operator_cache.clear if backend in circuit.operator_backends else None
+
+    result = {"gates": len(records)}
+    for stage in stages:
+        result[stage] = dict(zip(("time", "peak"), measure(functions[stage], repeat, setup)))
+
+    return result
+
+
+def run(max_qubits: int, backend: str, repeat: int, output=sys.stdout) -> dict:
+    """
+    Run the whole suite
+
+    :return: {"<backend>/<mix>/<size>": case result}
+    """
+
+    results = {}
+
+    for mix in mixes:
+        for size in range(1, max_qubits + 1):
+            key = "{}/{}/{}".format(backend, mix, size)
+            results[key] = case = run_case(size, mix, backend, repeat)
+
+            output.write("{:<28} {:>4} gates".format(key, case["gates"]))
+            for stage in stages:
+                output.write(" | {} {:9.6f}s {:9.1f}KiB".format(stage, case[stage]["time"], case[stage]["peak"] / 1024))
+            output.write("\n")
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_time: float = 1e-3) -> list:
+    """
+    Compare results against a baseline
+
+    :param tolerance: allowed ratio (ex: 1.5 -> 50% slower or bigger)
+    :param min_time: times below this (in both runs) are too noisy and never reported
+    :return: list of regressions messages
+    """
+
+    regressions = []
+
+    for key, case in results.items():
+        if key not in baseline:
+            continue
+
+        for stage in stages:
+            new, old = case[stage], baseline[key][stage]
+
+            if max(new["time"], old["time"]) >= min_time and new["time"] > old["time"] * tolerance:
+                regressions.append("{} {}: time {:.6f}s -> {:.6f}s".format(key, stage, old["time"], new["time"]))
+
+            if new["peak"] > old["peak"] * tolerance and new["peak"] - old["peak"] > 64 * 1024:
+                regressions.append("{} {}: peak memory {:.1f}KiB -> {:.1f}KiB".format(
+                    key, stage, old["peak"] / 1024, new["peak"] / 1024))
+
+    return regressions
+
+
+def main(argv: list = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Simulator benchmark suite")
+    parser.add_argument("--max-qubits", type=int, default=12)
+    parser.add_argument("--backend", default="statevector", choices=("statevector", "dense", "sparse"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=default_baseline, help="baseline file")
+    parser.add_argument("--save", action="store_true", help="save results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed time/memory ratio to the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.max_qubits, args.backend, args.repeat)
+
+    if args.save:
+        # Results of other backends/sizes already in the baseline are kept
+        try:
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            baseline = {}
+
+        baseline.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=1)
+        print("Baseline saved to {}".format(args.baseline))
+        return 0
+
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print("No baseline found ({}), run with --save first".format(args.baseline))
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    for regression in regressions:
+        print("[Regression] " + regression)
+    print("{} regression(s) against {}".format(len(regressions), args.baseline))
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from statevector import as_tensor, apply_operation, check_cancel
+from profiler import profiler
+
+
+"""
+
+Caches kept alive between successive simulations of the circuit (the GUI rebuilds a new 'circuit' object for each
+update, while most of the circuit is left unchanged by an edit).
+
+"""
+
+
+def operation_key(gate, index: int or list or tuple) -> tuple:
+    """ Hashable description of an operation (gate name and lines, gate matrix for unnamed/fused gates) """
+    lines = (index,) if type(index) is int else tuple(index)
+
+    if gate.name is None:
+        return gate.mat.tobytes(), lines
+    return gate.name, lines
+
+
+""" ##### ##### ##### ##### ##### ##### """
+
+
+class PrefixCache(object):
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20, compile=None):
+        """
+        Cache of the state after each column of the last simulated circuit.
+
+        When a new circuit is simulated, all leading columns identical to the cached ones are skipped and the
+        simulation starts back from the state after the last identical column: an edit in column k only recomputes
+        columns k, k+1, ...
+
+        Columns are keyed by their source (uncompiled) operations, the recomputed columns being compiled together.
+        Compilation merges gates across columns: only states after columns no merge crosses are kept, the others
+        are resumed from the closest kept state before them.
+
+        :param max_bytes: memory budget for the cached states (columns beyond it are computed but not cached)
+        :param compile: compilation of the recomputed operations, (operations, size, spans) -> (operations, removed
+                        gates), see compiler.compile_operations, operations are applied as they are if None
+        """
+
+        self.max_bytes = max_bytes
+        self.compile = compile
+
+        self.size = None
+        self.initial_state = None
+        self.dtype = None
+
+        # Key of each cached column, and state after that column (None if a compiled gate spans it)
+        self.keys = []
+        self.states = []
+
+        # Number of columns skipped, and gates removed by the compilation, during the last simulation
+        self.reused_columns = 0
+        self.removed_gates = 0
+
+        self.lock = threading.Lock()
+
+    def clear(self) -> None:
+        self.keys = []
+        self.states = []
+
+    def evolve(self, CIRCUIT, cancel=None) -> np.ndarray:
+        """
+        Final state of the given circuit, reusing cached states where possible.
+        If cancelled, the states of the columns completed so far stay cached.
+
+        :param CIRCUIT: 'circuit' object
+        :param cancel: threading.Event checked between gates (see statevector.evolve)
+        :return: final amplitudes
+        """
+
+        columns = CIRCUIT.get_columns()
+        keys = [(column, tuple(operation_key(gate, index) for gate, index, _ in operations))
+                for column, operations in columns]
+
+        with self.lock:
+
+            initial_state = CIRCUIT.get_initial_state()
+
+            # Another circuit size, precision or initial state invalidates all cached states
+            if self.size != CIRCUIT.size or self.dtype != CIRCUIT.dtype or \
+                    not np.array_equal(self.initial_state, initial_state):
+                self.clear()
+                self.size = CIRCUIT.size
+                self.dtype = CIRCUIT.dtype
+                self.initial_state = np.array(initial_state)
+
+            # Number of leading columns identical to the cached ones, back to the last one with a kept state
+            start = 0
+            while start < min(len(keys), len(self.keys)) and keys[start] == self.keys[start]:
+                start += 1
+            while start and self.states[start - 1] is None:
+                start -= 1
+
+            del self.keys[start:]
+            del self.states[start:]
+            self.reused_columns = start
+            profiler.count("reused columns", start)
+
+            operations = [operation for _, column in columns[start:] for operation in column]
+            spans = []
+            if self.compile is not None:
+                operations, self.removed_gates = self.compile(operations, self.size, spans)
+
+            # Compiled operations by column (operations on a line are kept in column order)
+            compiled = {}
+            for operation in operations:
+                compiled.setdefault(operation[2], []).append(operation)
+
+            state = (self.states[-1] if self.states else self.initial_state).copy()
+            tensor = as_tensor(state, self.size)
+            kept = sum(cached is not None for cached in self.states)
+
+            for key, (column, _) in zip(keys[start:], columns[start:]):
+                for gate, index, _ in compiled.get(column, ()):
+                    check_cancel(cancel)
+                    apply_operation(tensor, gate, index, self.size)
+
+                # Stop caching once the budget is reached (cached keys always form a prefix of the columns)
+                if (kept + 1) * state.nbytes <= self.max_bytes:
+                    # The state after a column a compiled gate spans is not the one of the source columns
+                    clean = not any(first <= column < last for first, last in spans)
+                    self.keys.append(key)
+                    self.states.append(state.copy() if clean else None)
+                    kept += clean
+
+            return state
+
+
+""" ##### ##### ##### ##### ##### ##### """
+
+
+class OperatorCache(object):
+
+    def __init__(self, max_bytes: int = 512 * 2 ** 20):
+        """
+        Least recently used cache of compiled column operators (full 2^n x 2^n matrices of the 'dense' backend).
+
+        Keys describe the content of a column (circuit size, gate names, target/control lines), so a column left
+        unchanged between two updates is not rebuilt through the kron chains of circuit._dense_operator.
+
+        :param max_bytes: memory budget, least recently used operators are evicted beyond it
+        """
+
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        """ Change the memory budget (evicting operators if needed) """
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def _evict(self) -> None:
+        """ Remove least recently used operators until within budget """
+        while self.entries and self.nbytes > self.max_bytes:
+            _, operator = self.entries.popitem(last=False)
+            self.nbytes -= operator.nbytes
+
+    def get(self, key: tuple, build) -> np.ndarray:
+        """
+        Retrieve an operator, building (and caching) it if missing.
+
+        :param key: hashable description of the operator
+        :param build: function building the operator
+        :return: operator
+        """
+
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                profiler.count("operator cache hits")
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+            self.misses += 1
+            profiler.count("operator cache misses")
+
+        operator = build()
+
+        # Operators larger than the whole budget are never cached
+        if operator.nbytes <= self.max_bytes:
+            with self.lock:
+                if key not in self.entries:
+                    self.entries[key] = operator
+                    self.nbytes += operator.nbytes
+                    self._evict()
+
+        return operator
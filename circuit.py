@@ -4,52 +4,403 @@ import numpy as np
 from gates import _0, _1, _I
 from gates import kron
 
+from statevector import evolve, check_cancel
+from cache import OperatorCache, operation_key
+import memmapState
+import parallelState
+import stabilizer
+from mps import MPS
+from sparseOperator import SparseOperator, SparseProduct
+import sampling
+from profiler import profiler
+
 
 """
 
-This file is practically the same as the original circuit simulation file. Hence many computations can be
-optimised. But as time was lacking I found myself forced to use it as it is now.
+Circuit model: gates are added column by column (add_gate) and the circuit is simulated on one of five backends
+(see circuit.backends), chosen by hand (set_backend) or by the planner (see planner.py). The 'dense' backend is the
+original full matrices code, the others are described below.
+
+Gate elimination (ex: hadamard followed by hadamard) and merging of "simple" gates following each other on the same
+line are done before simulation, see compiler.py.
+
+The 'dense' backend (original full matrices code) is namely slow for 5+ qubit circuits where computational time can
+reach over a second. Its operators are built column by column and kept in an LRU cache (cache.OperatorCache), so
+unchanged columns are not rebuilt from one update to the other. The 'sparse' backend has the same explicit operators
+semantics, but its operators only store the at most 2 non-zero elements of each row of a gate (see sparseOperator.py),
+O(2^n) memory and work per gate instead of O(4^n).
+
+Circuits made only of Clifford gates (no CH, CS) are simulated on a stabilizer tableau instead (see stabilizer.py)
+for probabilities and sampling, in polynomial time: the 'statevector' backend dispatches to it automatically, the
+'stabilizer' backend always uses it. Amplitudes (get_statevector, get_state ..) still come from the statevector.
 
-Ideas for future improvements:
-    - Separate "simple" and "complex" gates in computation:
-        "Merge" all "simple" gates with dot products before the outer product -> will eliminate the over-usage of
-        outer product with identity matrices, followed by, thus, heavier dot products.
-        Then include the remaining "complex" gates with the dot products after the outer product (current way) 
-    - Gate elimination when possible (ex: hadamard followed by hadamard)
+The 'mps' backend keeps the state as a matrix product state (see mps.py), with a bond dimension cap and truncation
+cutoff (set_truncation), for wide but shallow circuits: amplitudes of single bitstrings and samples never need the
+2^n amplitudes.
 
-The current simulator's speed is namely seen for 5+ qubit circuits where computational time can reach over a second.
-It is thus not recommended to use dynamical plotting for 5 or more qubits.
+The 'statevector' backend (default) keeps a single array of 2^n amplitudes and applies each gate only on the axes of
+its qubits (see statevector.py), which brings the work per gate down to O(2^n). Its amplitudes can be kept in a
+file instead of memory (set_storage, see memmapState.py) for circuits larger than the available memory, or be
+shared between several worker processes that apply the gates together (set_processes, see parallelState.py).
+
+The 'statevector', 'dense', 'sparse' and 'mps' backends run in double (complex128, default) or single (complex64)
+precision (set_precision): single precision halves the memory and bandwidth of the amplitudes (operators, tensors),
+its error on the probabilities is bounded by precision_error_bound (see check_precision). The stabilizer tableau only
+holds bits, precision does not apply to it.
 
 """
 
 
+# Column operators cache shared by all 'dense' and 'sparse' circuits
+operator_cache = OperatorCache()
+
+
+def estimate_cost(size: int, gates_amount: int, backend: str = "statevector", precision: str = "double") -> tuple:
+    """
+    Rough estimate of the resources needed to simulate a circuit once (used to check a size before accepting it).
+
+    :param size: circuit size (qubits amount)
+    :param gates_amount: number of gates of the circuit
+    :param backend: circuit backend
+    :param precision: 'single' or 'double' (see circuit.precisions)
+
+    :return: (time in s, memory in bytes)
+    """
+
+    if backend == "stabilizer":
+        # n x n tableau, O(n) per gate, O(n^3) row reduction for the outcomes
+        return gates_amount * size * 1e-7 + size ** 3 * 1e-8, 4 * size ** 2
+
+    if backend == "mps":
+        # Worst case: every bond at the cap (64), O(chi^3) SVD per two qubit gate
+        return gates_amount * (64 ** 3 * 1e-8 + 1e-4), 3 * size * 2 * 64 ** 2 * 16
+
+    amplitudes = 2 ** size
+    itemsize = np.dtype(circuit.precisions[precision]).itemsize
+
+    if backend == "dense":
+        # 2^n x 2^n operators: kron products (about n calls per gate) and column products
+        return gates_amount * (amplitudes ** 3 * 1e-9 + size * 2e-5 + 1e-5), 3 * itemsize * amplitudes ** 2
+
+    if backend == "sparse":
+        # 2 values per row and gate, all operators kept (cache)
+        return gates_amount * (amplitudes * 6e-8 + 5e-5), (2 * gates_amount + 3) * itemsize * amplitudes
+
+    # Each gate touches all amplitudes once (plus a fixed python overhead), state + temporaries
+    return gates_amount * (amplitudes * 1e-8 + 2e-5), 3 * itemsize * amplitudes
+
+
+def precision_error_bound(gates_amount: int, precision: str = "single") -> float:
+    """
+    Bound on the total error sum_i |p_i - p~_i| of the probabilities of a circuit simulated in the given precision.
+
+    With u the unit roundoff (2^-24 in single precision, 2^-53 in double), each gate pairs amplitudes through a 2x2
+    unitary whose rounded entries and complex multiply-adds add an error of norm at most 8u to the unit norm state.
+    Unitary gates do not grow the errors of previous gates, hence ||psi~ - psi|| <= 8 g u after g gates, and as
+    sum_i ||a_i|^2 - |b_i|^2| <= ||a - b|| (||a|| + ||b||), the probabilities error is at most twice that (plus 3u
+    for the final squared moduli).
+
+    :param gates_amount: number of gates applied
+    :param precision: 'single' or 'double' (see circuit.precisions)
+    :return: error bound
+    """
+    u = float(np.finfo(circuit.precisions[precision]).eps) / 2
+    return (16 * gates_amount + 3) * u
+
+
+def check_precision(CIRCUIT, precision: str = "single") -> tuple:
+    """
+    Compare the probabilities of a circuit simulated in the given precision against double precision.
+
+    :param CIRCUIT: 'circuit' object
+    :param precision: 'single' or 'double' (see circuit.precisions)
+
+    :return: (error sum_i |p_i - p~_i|, its bound (see precision_error_bound)), the error being above the bound
+             means something else than rounding is wrong
+    """
+
+    probabilities = {}
+
+    for p in ("double", precision):
+        copy = circuit(CIRCUIT.size, backend=CIRCUIT.backend)
+        copy.set_initial_state(CIRCUIT.initial_state)
+        copy.set_precision(p)
+        copy.operations = list(CIRCUIT.operations)
+
+        probabilities[p] = copy.get_probabilities().astype(np.float64)
+
+    error = np.abs(probabilities[precision] - probabilities["double"]).sum()
+    return error, precision_error_bound(len(CIRCUIT.operations), precision)
+
+
+def _select_probabilities(probabilities: np.ndarray, measurement_states: list or tuple or None,
+                          percentage: bool) -> np.ndarray:
+    """ Probabilities (last axis, 2^n states) of the given measurement states bitstrings """
+
+    if measurement_states is not None:
+        probabilities = probabilities[..., [int(state, 2) for state in measurement_states]]
+
+    if percentage:
+        probabilities = probabilities * 100
+
+    return probabilities
+
+
+def _read_probabilities(state: np.ndarray, measurement_states: list or tuple or None) -> np.ndarray:
+    """ Probabilities of the given measurement states (all 2^n states if None), amplitudes read chunk by chunk """
+
+    if measurement_states is not None:
+        return np.abs(state[[int(s, 2) for s in measurement_states]]) ** 2
+
+    probabilities = np.empty(len(state), dtype=state.real.dtype)
+    for start, chunk in memmapState.iter_probabilities(state):
+        probabilities[start:start + len(chunk)] = chunk
+
+    return probabilities
+
+
+def top_states(probabilities: np.ndarray, k: int = None, threshold: float = 0.) -> np.ndarray:
+    """
+    Indices of the most probable states, without sorting the whole vector (partial selection).
+
+    :param probabilities: probability of each state (2^n states in binary order)
+    :param k: at most k states, all if None
+    :param threshold: only states whose probability is at least the threshold (and non-zero)
+
+    :return: states indices, by decreasing probability (ties by increasing index)
+    """
+
+    probabilities = np.asarray(probabilities)
+
+    if threshold > 0:
+        indices = np.flatnonzero(probabilities >= threshold)
+    else:
+        indices = np.flatnonzero(probabilities > 0)
+
+    if k is not None and k < len(indices):
+        # k largest in O(2^n), only those get sorted
+        indices = indices[np.argpartition(-probabilities[indices], k - 1)[:k]]
+
+    return indices[np.lexsort((indices, -probabilities[indices]))]
+
+
+def batch_probabilities(circuits: list or tuple, measurement_states: list or tuple = None,
+                        percentage=False) -> np.ndarray:
+    """
+    Probabilities of many circuits of same size (each with its own initial state).
+    Circuits with the same gate list are evolved together in a single vectorized pass.
+
+    :param circuits: list of 'circuit' objects
+    :param measurement_states: list of measurement states bitstrings, all 2^n states if None
+    :param percentage: should the results be in percentage or not
+
+    :return: (number of circuits, number of measurement states) array of probabilities
+    """
+
+    if len({CIRCUIT.size for CIRCUIT in circuits}) > 1:
+        raise ValueError("All circuits must have the same size")
+
+    # Circuits sharing the same gate list (and backend, precision)
+    groups = {}
+    for i, CIRCUIT in enumerate(circuits):
+        key = (CIRCUIT.backend, CIRCUIT.precision,
+               tuple(operation_key(gate, index) for gate, index, _ in CIRCUIT.operations))
+        groups.setdefault(key, []).append(i)
+
+    probabilities = None
+
+    for indices in groups.values():
+        CIRCUIT = circuits[indices[0]]
+        states = np.array([circuits[i].get_initial_state() for i in indices])
+
+        result = CIRCUIT.get_probabilities_batch(states, measurement_states, percentage)
+
+        if probabilities is None:
+            probabilities = np.empty((len(circuits), result.shape[1]))
+        probabilities[indices] = result
+
+    return probabilities
+
+
 class circuit(object):
 
-    def __init__(self, circuit_size):
-        """ Circuit simulator object """
+    backends = ("statevector", "dense", "sparse", "stabilizer", "mps")
+    # Backends multiplying explicit gate operators
+    operator_backends = ("dense", "sparse")
+
+    # Amplitudes (and gate matrices) dtype of each precision
+    precisions = {"single": np.complex64, "double": np.complex128}
+
+    def __init__(self, circuit_size, backend="statevector"):
+        """
+        Circuit simulator object
+
+        :param circuit_size: number of qubits/lines
+        :param backend: 'statevector' (gates applied on the amplitudes), 'dense' (full 2^n x 2^n gate matrices),
+                        'sparse' (same operators, sparse), 'stabilizer' (tableau, Clifford gates only) or 'mps'
+                        (matrix product state)
+        """
+        if backend not in self.backends:
+            raise ValueError("Unknown backend '{}', must be one of {}".format(backend, self.backends))
+
         self.size = circuit_size
+        self.backend = backend
 
-        self.gates = []
-        self.initial_state = np.zeros(circuit_size * 2)
+        # (gate, index, column) operations, in order of application
+        self.operations = []
+        # |0...0> if None (see get_initial_state)
+        self.initial_state = None
         self.measurement_state = None
 
+        self.precision = "double"
+        self.dtype = self.precisions[self.precision]
+
+        # States cache shared between successive circuits ('statevector' backend only), see cache.PrefixCache
+        self.prefix_cache = None
+        # Column operators cache ('dense' and 'sparse' backends only), see cache.OperatorCache
+        self.operator_cache = operator_cache
+        # threading.Event cancelling the simulation once set (checked between gates)
+        self.cancel_event = None
+        # Amplitudes file ('statevector' backend only), amplitudes are kept in memory if None
+        self.storage = None
+        # Worker processes sharing the amplitudes ('statevector' backend only), a single process if None
+        self.processes = None
+
+        # 'statevector' circuits of Clifford gates only (from |0...0>) are simulated on a stabilizer tableau
+        self.stabilizer_dispatch = True
+        # Last computed stabilizer tableau and the gate list it was computed for (see get_tableau)
+        self.tableau = None
+        self.tableau_key = None
+
+        # Bond dimension cap and singular values cutoff ('mps' backend only), see mps.MPS
+        self.max_bond = 64
+        self.cutoff = 1e-12
+        # Last computed matrix product state and the gate list it was computed for (see get_mps)
+        self.mps = None
+        self.mps_key = None
+
+        # Last computed unitary of the circuit and the gate list it was computed for (see get_unitary)
+        self.unitary = None
+        self.unitary_key = None
+
     """ ##### ##### ##### ##### ##### ##### """
 
+    def set_backend(self, backend: str) -> None:
+        """
+        Change the backend of the circuit (see circuit.backends, planner.py)
+
+        :param backend: 'statevector', 'dense', 'sparse', 'stabilizer' or 'mps'
+        """
+        if backend not in self.backends:
+            raise ValueError("Unknown backend '{}', must be one of {}".format(backend, self.backends))
+        if self.storage is not None and backend != "statevector":
+            raise ValueError("Only the 'statevector' backend supports file storage")
+        self.backend = backend
+
     def set_initial_state(self, initial_state):
         self.initial_state = initial_state
 
     def _set_measurement_state(self, measurement_state):
         self.measurement_state = measurement_state
 
-    def add_gate(self, gate, index: int or list or tuple) -> None:
+    def set_prefix_cache(self, prefix_cache):
+        self.prefix_cache = prefix_cache
+
+    def set_operator_cache(self, operator_cache):
+        self.operator_cache = operator_cache
+
+    def set_cancel_event(self, cancel_event):
+        self.cancel_event = cancel_event
+
+    def set_precision(self, precision: str) -> None:
+        """
+        Precision of the simulation (amplitudes and gate matrices)
+
+        :param precision: 'single' (complex64) or 'double' (complex128)
+        """
+        if precision not in self.precisions:
+            raise ValueError("Unknown precision '{}', must be one of {}".format(precision, tuple(self.precisions)))
+
+        self.precision = precision
+        self.dtype = self.precisions[precision]
+
+    def set_truncation(self, max_bond: int = 64, cutoff: float = 1e-12) -> None:
+        """
+        Truncation of the 'mps' backend
+
+        :param max_bond: bond dimension cap
+        :param cutoff: singular values whose relative weight (squared) is below it are dropped
+        """
+        self.max_bond = max_bond
+        self.cutoff = cutoff
+
+    def get_initial_state(self) -> np.ndarray:
+        """ Initial amplitudes, in the circuit precision """
+
+        if self.initial_state is None:
+            state = np.zeros(2 ** self.size, dtype=self.dtype)
+            state[0] = 1
+            return state
+
+        return np.asarray(self.initial_state, dtype=self.dtype)
+
+    def set_storage(self, storage: str or None) -> None:
+        """
+        Keep the amplitudes in a memory mapped file (see memmapState.py), in memory if None.
+        A None initial state (|0...0>) is then written directly to the file, no 2^n array is ever built in memory.
+
+        :param storage: amplitudes file path (overwritten by each simulation)
+        """
+        if storage is not None and self.backend != "statevector":
+            raise ValueError("Only the 'statevector' backend supports file storage")
+        self.storage = storage
+
+    def set_processes(self, processes: int or None) -> None:
+        """
+        Apply the gates on several processes sharing the amplitudes (see parallelState.py), 'statevector' backend
+
+        :param processes: number of worker processes (rounded down to a power of two), a single process if None
+        """
+        self.processes = processes
+
+    def _parallel(self) -> bool:
+        """ Whether the gates are applied by several processes (see set_processes) """
+        return self.backend == "statevector" and self.storage is None and self.processes is not None and \
+            self.processes > 1 and self._cached_unitary() is None
+
+    def add_gate(self, gate, index: int or list or tuple, column: int = None) -> None:
         """
         Add a gate to the circuit.
 
         :param gate: gate object to be added
         :param index: index of the circuit line (from top to bottom)
+        :param column: column (gate number) of the gate, same as the previous gate if None
         :return: None
         """
 
+        if type(index) not in [int, list, tuple]:
+            raise TypeError("Index must be an int, list or tuple")
+
+        if column is None:
+            column = self.operations[-1][2] if self.operations else 0
+
+        self.operations.append((gate, index, column))
+
+    def _dense_operator(self, gate, index: int or list or tuple) -> np.ndarray:
+        """
+        Full 2^n x 2^n matrix of a gate, by tensor product with the identity on all other lines.
+
+        :param gate: gate object
+        :param index: index of the circuit line (from top to bottom)
+        :return: gate matrix
+        """
+
+        with profiler.span("construction", gate=gate.name or "fused", index=str(index)):
+            return self._build_dense_operator(gate, index)
+
+    def _build_dense_operator(self, gate, index: int or list or tuple) -> np.ndarray:
+        """ See _dense_operator """
+
         if type(index) is int:
             # Simple gate case
             # Tensor product between all circuit lines with either identity matrix or with gate matrix
@@ -65,7 +416,7 @@ class circuit(object):
                 elif i > index:
                     result = np.kron(result, _I.get_mat())
 
-        elif type(index) in [list, tuple]:
+        else:
             # Complex/controlled gate case
 
             # "activator" (usually but can be inverted)
@@ -98,54 +449,437 @@ class circuit(object):
 
                 result += tensorProduct
 
-        else:
-            raise TypeError("Index must be an int, list or tuple")
+        return result
+
+    def _sparse_operator(self, gate, index: int or list or tuple) -> SparseOperator:
+        """ Same operator as _dense_operator, stored sparse (see sparseOperator.py) """
+
+        with profiler.span("construction", gate=gate.name or "fused", index=str(index), sparse=True):
+            if type(index) is int:
+                return SparseOperator(self.size, (index,), gate.get_mat(), self.dtype)
+
+            # Same activators/gate matrices as _build_dense_operator, on the two lines only
+            first_gates = gate.activators
+            last_gates = [_I.get_mat(), gate.get_mat()]
+
+            if index[0] > index[1]:
+                first_gates, last_gates = last_gates, first_gates
+                index = (index[1], index[0])
+
+            local = sum(np.kron(first_gates[j], last_gates[j]) for j in range(2))
+            return SparseOperator(self.size, tuple(index), local, self.dtype)
+
+    def _column_operator(self, operations: list) -> np.ndarray or SparseProduct:
+        """
+        Full 2^n x 2^n matrix of a column (product of all its gates matrices), in the circuit precision ('sparse'
+        backend: product of its gates sparse operators)
+        """
+
+        if self.backend == "sparse":
+            return SparseProduct(self.size, [self._sparse_operator(gate, index) for gate, index, _ in operations],
+                                 self.dtype)
+
+        result = self._dense_operator(*operations[0][:2])
 
-        # Add final tensor product to dot product step
-        self.gates.append(result)
+        for gate, index, _ in operations[1:]:
+            result = np.dot(self._dense_operator(gate, index), result)
+
+        return result.astype(self.dtype, copy=False)
+
+    def get_operators(self) -> list:
+        """
+        Retrieve the full 2^n x 2^n operator of each column (in order of application), through the cache.
+        Operators of the 'sparse' backend are SparseProduct objects, used through the @ operator like matrices.
+        """
+
+        operators = []
+
+        for _, operations in self.get_columns():
+            key = (self.backend, self.size, self.precision,
+                   tuple(operation_key(gate, index) for gate, index, _ in operations))
+            operators.append(self.operator_cache.get(key, lambda: self._column_operator(operations)))
+
+        return operators
+
+    def is_clifford(self) -> bool:
+        """ Whether the circuit is only made of Clifford gates (see stabilizer.clifford_gates) """
+        return stabilizer.is_clifford(self.operations)
+
+    def uses_stabilizer(self, all_outcomes: bool = False) -> bool:
+        """
+        Whether probabilities and samples come from a stabilizer tableau (see get_tableau)
+
+        :param all_outcomes: all outcomes are listed (all 2^n probabilities ..): 'statevector' circuits with more than
+                             2^max_outcome_bits outcomes (see stabilizer.max_outcome_bits) stay on the amplitudes
+        """
+
+        if self.backend == "stabilizer":
+            if not self.is_clifford() or self.initial_state is not None:
+                raise ValueError("The 'stabilizer' backend only simulates Clifford gates from |0...0>")
+            return True
+
+        if not (self.backend == "statevector" and self.stabilizer_dispatch and self.storage is None and
+                self.initial_state is None and self.is_clifford()):
+            return False
+
+        return not all_outcomes or len(self.get_tableau().support()[1]) <= stabilizer.max_outcome_bits
+
+    def get_tableau(self) -> stabilizer.Tableau:
+        """ Stabilizer tableau of the final state (Clifford circuits only), kept until the gate list changes """
+
+        key = self._unitary_key()
+        if self.tableau is not None and self.tableau_key == key:
+            return self.tableau
+
+        with profiler.span("simulation", backend="stabilizer", size=self.size, gates=len(self.operations)):
+            tableau = stabilizer.Tableau(self.size)
+
+            for gate, index, _ in self.operations:
+                tableau.apply(gate.name, index)
+
+        self.tableau, self.tableau_key = tableau, key
+        return tableau
+
+    def get_mps(self) -> MPS:
+        """ Matrix product state of the final state ('mps' backend), kept until the gate list or truncation change """
+
+        key = (self._unitary_key(), self.max_bond, self.cutoff)
+        if self.mps is not None and self.mps_key == key:
+            return self.mps
+
+        if self.initial_state is not None:
+            raise ValueError("The 'mps' backend only simulates circuits from |0...0>")
+
+        with profiler.span("simulation", backend="mps", size=self.size, gates=len(self.operations)) as info:
+            state = MPS(self.size, self.max_bond, self.cutoff, self.dtype)
+
+            for gate, index, _ in self.operations:
+                check_cancel(self.cancel_event)
+                state.apply_operation(gate, index)
+
+            info["truncation_error"] = state.truncation_error
+            info["max_bond"] = max(state.bond_dimensions(), default=1)
+
+        self.mps, self.mps_key = state, key
+        return state
+
+    def get_truncation_error(self) -> float:
+        """ Sum of the weights discarded by the 'mps' backend (0 for exact backends), see mps.py """
+        return self.get_mps().truncation_error if self.backend == "mps" else 0.
+
+    def get_amplitude(self, measurement_state: str) -> complex:
+        """
+        Amplitude of a single measurement state
+
+        :param measurement_state: bitstring of '0' and '1' (first char being line 0)
+        """
+        if self.backend == "mps":
+            return self.get_mps().amplitude(measurement_state)
+        return self.get_statevector()[int(measurement_state, 2)]
+
+    def _unitary_key(self) -> tuple:
+        """ Description of the gate list (and precision) the unitary depends on """
+        return self.precision, tuple(operation_key(gate, index) for gate, index, _ in self.operations)
+
+    def _cached_unitary(self) -> np.ndarray or None:
+        """ Unitary of the circuit if it was computed for the current gate list, None otherwise """
+        if self.unitary is not None and self.unitary_key == self._unitary_key():
+            return self.unitary
+        return None
+
+    def get_unitary(self) -> np.ndarray:
+        """
+        Full 2^n x 2^n unitary of the circuit, kept on the circuit until its gate list changes. While it is valid,
+        final states, measurements and batches (whatever the initial state or measurement bra) cost a single
+        matrix-vector product.
+
+        The 'statevector' backend evolves all basis states in a single batch (column i being the final state of
+        |i>), the 'dense' and 'sparse' backends multiply their column operators.
+
+        :return: unitary, U[i, j] = <i|U|j>
+        """
+
+        unitary = self._cached_unitary()
+        if unitary is not None:
+            return unitary
+
+        key = self._unitary_key()
+
+        with profiler.span("unitary", backend=self.backend, size=self.size, gates=len(self.operations)):
+            if self.backend in self.operator_backends:
+                unitary = np.eye(2 ** self.size, dtype=self.dtype)
+
+                for gate in self.get_operators():
+                    check_cancel(self.cancel_event)
+                    unitary = gate @ unitary
+            else:
+                # Row i of the batch is the final state of |i>
+                unitary = evolve(np.eye(2 ** self.size), self.operations, self.size, self.cancel_event,
+                                 self.dtype).T
+
+        self.unitary, self.unitary_key = unitary, key
+        return unitary
+
+    def get_statevector(self) -> np.ndarray:
+        """ Retrieve the final state of the circuit (all 2^n amplitudes) """
+
+        unitary = self._cached_unitary()
+        if unitary is not None and self.storage is None:
+            return np.dot(unitary, self.get_initial_state())
+
+        if self.backend in self.operator_backends:
+            result = self.get_initial_state()
+
+            for gate in self.get_operators():
+                check_cancel(self.cancel_event)
+                result = gate @ result
+
+            return result
+
+        if self.backend == "mps":
+            return self.get_mps().to_statevector()
+
+        if self.storage is not None:
+            return memmapState.evolve(self.storage, self.initial_state, self.operations, self.size,
+                                      self.cancel_event, dtype=self.dtype)
+
+        if self._parallel():
+            # Copied out of the shared amplitudes, see get_probabilities and get_state for results read in place
+            return parallelState.evolve(self.initial_state, self.operations, self.size, self.processes,
+                                        self.cancel_event, self.dtype)
+
+        if self.prefix_cache is not None:
+            return self.prefix_cache.evolve(self, self.cancel_event)
+
+        return evolve(self.get_initial_state(), self.operations, self.size, self.cancel_event, self.dtype)
+
+    def get_columns(self) -> list:
+        """
+        Operations grouped by column (operations on a same line are always in increasing column order)
+
+        :return: list of (column, list of operations) in increasing column order
+        """
+
+        columns = {}
+        for operation in self.operations:
+            columns.setdefault(operation[2], []).append(operation)
+
+        return sorted(columns.items())
 
     def get_state(self):
         """ Retrieve the completed dot product of the circuit """
 
+        unitary = self._cached_unitary()
+        if unitary is not None:
+            return np.dot(np.dot(self.measurement_state, unitary), self.get_initial_state())
+
+        if self._parallel():
+            return parallelState.evolve(self.initial_state, self.operations, self.size, self.processes,
+                                        self.cancel_event, self.dtype,
+                                        lambda state: np.dot(self.measurement_state, state))
+
+        if self.backend not in self.operator_backends:
+            return np.dot(self.measurement_state, self.get_statevector())
+
         result = self.measurement_state
 
-        for gate in np.array(self.gates)[::-1]:
-            result = np.dot(result, gate)
+        for gate in reversed(self.get_operators()):
+            result = result @ gate
 
-        result = np.dot(result, self.initial_state)
+        result = np.dot(result, self.get_initial_state())
         return result
 
-    def get_probabilities(self, measurement_states: list or tuple, percentage=False) -> list:
+    def get_probabilities(self, measurement_states: list or tuple = None, percentage=False) -> np.ndarray:
         """
-        Make measurement of all possible state of the circuit and return probabilities of possible states
+        Probabilities of the given measurement states, computed in a single pass: the circuit is evolved once and
+        the probabilities are read from the final amplitudes.
 
-        :param measurement_states: list of measurement states combinations (of <0| and <1|)
+        :param measurement_states: list of measurement states bitstrings ('0'/'1', first char being line 0),
+                                   all 2^n states in binary order if None
         :param percentage: should the results be in percentage or not
 
-        :return:
+        :return: probabilities, in the same order as measurement_states
+        """
+
+        if self.uses_stabilizer(all_outcomes=measurement_states is None):
+            tableau = self.get_tableau()
+
+            with profiler.span("probability extraction"):
+                if measurement_states is not None:
+                    probabilities = np.array([tableau.probability(state) for state in measurement_states])
+                else:
+                    probabilities = tableau.probabilities()
+
+                return _select_probabilities(probabilities, None, percentage)
+
+        if self.backend == "mps" and measurement_states is not None:
+            # Only the requested amplitudes are contracted
+            state = self.get_mps()
+            probabilities = np.array([state.probability(bitstring) for bitstring in measurement_states])
+            return _select_probabilities(probabilities, None, percentage)
+
+        if self._parallel():
+            # Probabilities read from the shared amplitudes, which are never copied
+            with profiler.span("simulation", backend=self.backend, size=self.size, gates=len(self.operations),
+                               processes=self.processes):
+                probabilities = parallelState.evolve(self.initial_state, self.operations, self.size, self.processes,
+                                                     self.cancel_event, self.dtype,
+                                                     lambda state: _read_probabilities(state, measurement_states))
+
+            return _select_probabilities(probabilities, None, percentage)
+
+        with profiler.span("simulation", backend=self.backend, size=self.size, gates=len(self.operations)):
+            state = self.get_statevector()
+
+        with profiler.span("probability extraction"):
+            if self.storage is None:
+                return _select_probabilities(np.abs(state) ** 2, measurement_states, percentage)
+
+            return _select_probabilities(_read_probabilities(state, measurement_states), None, percentage)
+
+    def iter_probabilities(self, chunk: int = None):
+        """
+        Stream the probabilities of all 2^n states chunk by chunk (never all in memory with file storage)
+
+        :param chunk: qubits per chunk (see memmapState.chunk_qubits)
+        :return: generator of (index of the first state, probabilities) chunks
         """
+        with profiler.span("simulation", backend=self.backend, size=self.size, gates=len(self.operations)):
+            state = self.get_statevector()
 
-        # Careful you are approaching ugly code, please do not interact with it too much, or you will scare it away
+        return memmapState.iter_probabilities(state, chunk)
 
-        m_states = []
+    def evolve_batch(self, states: np.ndarray) -> np.ndarray:
+        """
+        Evolve many input states through the circuit in a single vectorized pass (the initial state is ignored).
 
-        # Convert from str to real gates
-        for state in measurement_states:
-            s = []
-            for char in state:
-                if char == "0":
-                    s.append(_0)
-                elif char == "1":
-                    s.append(_1)
-            m_states.append(s)
+        :param states: (batch, 2^n) array of input states
+        :return: (batch, 2^n) array of final states
+        """
+
+        states = np.asarray(states, dtype=self.dtype)
+
+        unitary = self._cached_unitary()
+        if unitary is not None:
+            return np.dot(states, unitary.T)
+
+        if self.backend in self.operator_backends:
+            result = states
+
+            for gate in self.get_operators():
+                check_cancel(self.cancel_event)
+                result = (gate @ result.T).T
+
+            return result
+
+        return evolve(states, self.operations, self.size, self.cancel_event, self.dtype)
+
+    def get_probabilities_batch(self, states: np.ndarray, measurement_states: list or tuple = None,
+                                percentage=False) -> np.ndarray:
+        """
+        Probabilities of the given measurement states for many input states (see evolve_batch).
+
+        :param states: (batch, 2^n) array of input states
+        :param measurement_states: list of measurement states bitstrings, all 2^n states if None
+        :param percentage: should the results be in percentage or not
+
+        :return: (batch, number of measurement states) array of probabilities
+        """
+        return _select_probabilities(np.abs(self.evolve_batch(states)) ** 2, measurement_states, percentage)
+
+    def iter_counts(self, shots: int, chunk: int = None, seed=None):
+        """
+        Stream shots counts of all 2^n states, chunk by chunk (see sampling.iter_counts)
+
+        :param shots: total number of shots
+        :param chunk: number of shots per chunk
+        :param seed: seed or numpy Generator
+
+        :return: generator of counts arrays (2^n states in binary order)
+        """
+        return sampling.iter_counts(self.get_probabilities(), shots, chunk, seed)
+
+    def iter_state_counts(self, shots: int, chunk: int = None, seed=None):
+        """
+        Sample all the shots at once, counts being streamed by chunks of states (see sampling.iter_chunk_counts),
+        for state spaces too large for a single counts array
+
+        :param shots: number of shots
+        :param chunk: qubits per chunk of states (see memmapState.chunk_qubits)
+        :param seed: seed or numpy Generator
+
+        :return: generator of (index of the first state, counts) chunks
+        """
+        state = self.get_statevector()
+        return sampling.iter_chunk_counts(lambda: memmapState.iter_probabilities(state, chunk), shots, seed)
+
+    def get_counts(self, shots: int, measurement_states: list or tuple = None, chunk: int = None,
+                   seed=None) -> np.ndarray:
+        """
+        Sample the final state of the circuit.
+
+        :param shots: number of shots
+        :param measurement_states: list of measurement states bitstrings, all 2^n states if None
+        :param chunk: number of shots per chunk
+        :param seed: seed or numpy Generator
+
+        :return: counts of each measurement state
+        """
+        if self.storage is None:
+            counts = sampling.sample_counts(self.get_probabilities(), shots, chunk, seed)
+        else:
+            # Probabilities are never all in memory, shots are sampled by chunks of states
+            counts = np.zeros(2 ** self.size, dtype=np.int64)
+            for start, chunk_counts in self.iter_state_counts(shots, seed=seed):
+                counts[start:start + len(chunk_counts)] = chunk_counts
+
+        if measurement_states is not None:
+            counts = counts[[int(state, 2) for state in measurement_states]]
+
+        return counts
+
+    def get_sparse_counts(self, shots: int, seed=None) -> dict:
+        """
+        Sample the final state of the circuit, without any 2^n array for Clifford circuits (see uses_stabilizer) and
+        the 'mps' backend
+
+        :param shots: number of shots
+        :param seed: seed or numpy Generator
+
+        :return: {state index: count} of the sampled states
+        """
+
+        if self.backend == "mps":
+            samples = self.get_mps().iter_samples(shots, seed=seed)
+        elif self.uses_stabilizer():
+            samples = self.get_tableau().iter_samples(shots, seed=seed)
+        else:
+            counts = self.get_counts(shots, seed=seed)
+            return {i: counts[i] for i in np.flatnonzero(counts)}
+
+        sparse = {}
+
+        for outcomes in samples:
+            for i, count in zip(*stabilizer.count_indices(outcomes)):
+                sparse[i] = sparse.get(i, 0) + count
+
+        return sparse
+
+    def get_probability(self, measurement_state: str) -> float:
+        """
+        Probability of a single measurement state (through make_measurement, or the stabilizer tableau)
+
+        :param measurement_state: bitstring of '0' and '1' (first char being line 0)
+        """
 
-        # Make measurement for each measurement state
-        probabilities = [self.make_measurement(kron(*state)) for state in m_states]
+        if self.uses_stabilizer():
+            return self.get_tableau().probability(measurement_state)
 
-        if percentage:
-            probabilities = [prob * 100 for prob in probabilities]
+        if self.backend == "mps":
+            return self.get_mps().probability(measurement_state)
 
-        return probabilities
+        bra = kron(*[_0 if char == "0" else _1 for char in measurement_state])
+        return self.make_measurement(bra)
 
     def make_measurement(self, measurement_state: list or tuple) -> float or int:
         """ Retrieve probability for a given measurement state """
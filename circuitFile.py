@@ -0,0 +1,247 @@
+import json
+import struct
+
+
+"""
+
+Circuit files.
+
+A circuit is saved as its size and its gate records (gate name, column, target line, control line or None), i.e.
+the model built by circuit_frame.convert_to_simulator (see qcs.build_circuit).
+
+Formats (chosen from the file extension):
+    .json  -> a single circuit, for editing:
+              {"size": 2, "gates": [{"gate": "H", "column": 0, "target": 0},
+                                    {"gate": "CX", "column": 1, "target": 1, "control": 0}]}
+    .jsonl -> one JSON circuit per line
+    .qcb   -> packed binary, for volume: header b"QCSB" + version, then for each circuit
+              size (uint16), gates amount (uint32) and 9 bytes per gate: gate code (uint8), column (uint32),
+              target and control (uint16, 65535 for no control), gate codes being indices in gate_codes.
+              Version 1 files (uint8 size, uint16 gates amount, 4 bytes per gate, 255 for no control) are still read.
+
+Multi-circuit files (.jsonl, .qcb) are read and written one circuit at a time (see iter_circuits, CircuitWriter),
+so files with thousands of circuits never need to fit in memory.
+
+Circuits are checked when read and written (see check_records): known gates on lines of the circuit, a control line
+for controlled gates only (other than the target), and at most one gate per line and column, as in the editor.
+
+"""
+
+gate_codes = ("I", "X", "Y", "Z", "S", "H", "sqrt", "CX", "CY", "CZ", "CH", "CS")
+controlled_gates = ("CX", "CY", "CZ", "CH", "CS")
+
+MAGIC = b"QCSB"
+VERSION = 2
+
+# Version -> (circuit header, gate record, no control value)
+_layouts = {1: (struct.Struct("<BH"), struct.Struct("<BBBB"), 255),
+            2: (struct.Struct("<HI"), struct.Struct("<BIHH"), 65535)}
+
+
+def file_format(path: str) -> str:
+    """ 'json', 'jsonl' or 'qcb' """
+    if path.endswith(".qcb"):
+        return "qcb"
+    if path.endswith(".jsonl"):
+        return "jsonl"
+    return "json"
+
+
+""" ##### ##### ##### ##### ##### ##### """
+
+
+def check_records(size: int, records: list or tuple) -> None:
+    """ ValueError if the gate records do not describe a valid circuit of the given size """
+
+    if type(size) is not int or size < 1:
+        raise ValueError("Invalid circuit size {!r}".format(size))
+
+    used = set()
+
+    for name, column, target, control in records:
+        if name not in gate_codes:
+            raise ValueError("Unknown gate '{}', must be one of {}".format(name, gate_codes))
+        if (control is not None) != (name in controlled_gates):
+            raise ValueError("Gate '{}' {} control line".format(name, "needs a" if control is None else "takes no"))
+        if type(column) is not int or column < 0:
+            raise ValueError("Invalid column {!r} of gate '{}'".format(column, name))
+
+        if control == target:
+            raise ValueError("Gate '{}' on column {} has the same control and target line".format(name, column))
+
+        lines = (target,) if control is None else (target, control)
+        for line in lines:
+            if type(line) is not int or not 0 <= line < size:
+                raise ValueError("Line {!r} of gate '{}' out of the {} lines of the circuit".format(line, name, size))
+            if (line, column) in used:
+                raise ValueError("Several gates on line {} of column {}".format(line, column))
+            used.add((line, column))
+
+
+def to_dict(size: int, records: list or tuple) -> dict:
+    """ JSON description of a circuit """
+
+    gates = []
+    for name, column, target, control in records:
+        gate = {"gate": name, "column": column, "target": target}
+        if control is not None:
+            gate["control"] = control
+        gates.append(gate)
+
+    return {"size": size, "gates": gates}
+
+
+def from_dict(data: dict) -> tuple:
+    """ (size, records) of a JSON description """
+    records = [(g["gate"], g["column"], g["target"], g.get("control")) for g in data["gates"]]
+    check_records(data["size"], records)
+    return data["size"], records
+
+
+def _check_range(name: str, value: int, limit: int) -> None:
+    """ ValueError if a packed field is out of its range [0, limit) """
+    if not 0 <= value < limit:
+        raise ValueError("{} {} out of the packed range [0, {})".format(name, value, limit))
+
+
+def pack(size: int, records: list or tuple) -> bytes:
+    """ Packed binary form of a circuit (without file header) """
+
+    circuit_header, gate_record, no_control = _layouts[VERSION]
+
+    _check_range("Circuit size", size, 2 ** 16)
+    _check_range("Gates amount", len(records), 2 ** 32)
+
+    data = [circuit_header.pack(size, len(records))]
+
+    for name, column, target, control in records:
+        if name not in gate_codes:
+            raise ValueError("Unknown gate '{}', must be one of {}".format(name, gate_codes))
+        # The no control value is not a line
+        _check_range("Column", column, 2 ** 32)
+        _check_range("Target line", target, no_control)
+        if control is not None:
+            _check_range("Control line", control, no_control)
+
+        data.append(gate_record.pack(gate_codes.index(name), column, target,
+                                     no_control if control is None else control))
+
+    return b"".join(data)
+
+
+def read_packed(file, version: int = VERSION) -> tuple or None:
+    """ Read the next packed circuit of a binary file, None at the end of the file """
+
+    circuit_header, gate_record, no_control = _layouts[version]
+
+    header = file.read(circuit_header.size)
+    if not header:
+        return None
+    if len(header) < circuit_header.size:
+        raise ValueError("Truncated circuit binary file (circuit header)")
+
+    size, gates_amount = circuit_header.unpack(header)
+    data = file.read(gates_amount * gate_record.size)
+    if len(data) < gates_amount * gate_record.size:
+        raise ValueError("Truncated circuit binary file ({} of {} gates)"
+                         .format(len(data) // gate_record.size, gates_amount))
+
+    records = []
+    for code, column, target, control in gate_record.iter_unpack(data):
+        if code >= len(gate_codes):
+            raise ValueError("Unknown gate code {} in circuit binary file".format(code))
+        records.append((gate_codes[code], column, target, None if control == no_control else control))
+
+    check_records(size, records)
+    return size, records
+
+
+""" ##### ##### ##### ##### ##### ##### """
+
+
+def iter_circuits(path: str):
+    """
+    Stream the circuits of a file.
+
+    :param path: circuit file (see file_format)
+    :return: generator of (size, records)
+    """
+
+    form = file_format(path)
+
+    if form == "qcb":
+        with open(path, "rb") as file:
+            version = file.read(len(MAGIC) + 1)
+            if version[:len(MAGIC)] != MAGIC or version[len(MAGIC):] not in [bytes([v]) for v in _layouts]:
+                raise ValueError("'{}' is not a circuit binary file".format(path))
+
+            while (circuit := read_packed(file, version[-1])) is not None:
+                yield circuit
+
+    elif form == "jsonl":
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    yield from_dict(json.loads(line))
+
+    else:
+        with open(path) as file:
+            yield from_dict(json.load(file))
+
+
+def load(path: str) -> tuple:
+    """ (size, records) of the first circuit of a file """
+    for circuit in iter_circuits(path):
+        return circuit
+    raise ValueError("'{}' contains no circuit".format(path))
+
+
+def save(path: str, size: int, records: list or tuple) -> None:
+    """ Save a single circuit (format from the file extension) """
+    with CircuitWriter(path) as writer:
+        writer.write(size, records)
+
+
+class CircuitWriter(object):
+
+    def __init__(self, path: str):
+        """
+        Write circuits to a file one at a time (format from the file extension, a .json file holds a single circuit)
+
+        :param path: circuit file
+        """
+
+        self.form = file_format(path)
+        self.written = 0
+
+        if self.form == "qcb":
+            self.file = open(path, "wb")
+            self.file.write(MAGIC + bytes([VERSION]))
+        else:
+            self.file = open(path, "w")
+
+    def write(self, size: int, records: list or tuple) -> None:
+
+        check_records(size, records)
+
+        if self.form == "qcb":
+            self.file.write(pack(size, records))
+
+        elif self.form == "jsonl":
+            self.file.write(json.dumps(to_dict(size, records)) + "\n")
+
+        else:
+            if self.written:
+                raise ValueError("A .json file holds a single circuit, use .jsonl or .qcb")
+            json.dump(to_dict(size, records), self.file, indent=1)
+
+        self.written += 1
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -6,7 +6,8 @@ from tkManagementFuncs import *
 from dimensions import *
 
 from circuit import circuit
-from gates import kron, gates
+from qcs import build_circuit
+from profiler import profiler
 
 
 """ ===== ===== ===== DYNAMIC CANVAS ===== ===== ===== """
@@ -206,33 +207,17 @@ class qubit_subframe(Frame):
 
 class circuit_frame(Frame):
 
-    def convert_to_simulator(self) -> circuit:
+    def get_records(self) -> list:
         """
-        Convert circuit to 'circuit' simulator object
+        Gate records of the circuit (model saved in circuit files, see circuitFile.py)
 
-        :return: 'circuit' object
+        :return: list of (gate name, column, target line, control line or None)
         """
 
-        init = kron(*[gates["0"] for _ in range(self.size)])
-        CIRCUIT = circuit(self.size)
-        CIRCUIT.set_initial_state(init)
-
-        def is_row_complex():
-            """ Does the row contain a complex gate? (target/control) """
-            is_complex = False
-
-            for line in self.LINES:
-                if isinstance(line[i], DynamicButton):
-                    if line[i].is_complex():
-                        is_complex = True
-                        break
-            return is_complex
-
-        def add_complex_row():
-            """ Add all elements the given row, knowing that it contains 'complex' gates """
-
-            encountered_gates = []
+        records = []
 
+        # (here naming is a bit fishy as by row I actually mean columns if you look at it from your perspective)
+        for i in range(gate_n_per_line):
             for j, line in enumerate(self.LINES):
 
                 if isinstance(line[i], DynamicButton):
@@ -245,35 +230,23 @@ class circuit_frame(Frame):
                         target_gate = master_line_target.dynamic_content[i]
                         control_gate = master_line_control.dynamic_content[i]
 
-                        # As there will be detected both target and control gates during gates detection we need to ignore one
-                        # of the two as it automatically adds the other when using .add_gate
-                        if (target_gate.coor[0] not in encountered_gates) and (control_gate.coor[0] not in encountered_gates):
-
-                            encountered_gates.append(target_gate.coor[0])
-                            encountered_gates.append(control_gate.coor[0])
-
-                            CIRCUIT.add_gate(gate=gates[target_gate.name], index=(control_gate.coor[0], target_gate.coor[0]))
+                        # Both target and control gates are detected, only keep the pair once (from the target)
+                        if line[i] is target_gate:
+                            records.append((target_gate.name, i, target_gate.coor[0], control_gate.coor[0]))
 
                     else:
-                        CIRCUIT.add_gate(gate=gates[line[i].name], index=j)
+                        records.append((line[i].name, i, j, None))
 
-        def add_simple_row():
-            """ Add all elements the given row, knowing that it contains only 'simple' gates """
+        return records
 
-            for j, line in enumerate(self.LINES):
-                if isinstance(line[i], DynamicButton):
-
-                    CIRCUIT.add_gate(gate=gates[line[i].name], index=j)
-
-        # Add all gates, gates row by gates row
-        # (here naming is a bit fishy as by row I actually mean columns if you look at it from your perspective)
-        for i in range(gate_n_per_line):
-            if is_row_complex():
-                add_complex_row()
-            else:
-                add_simple_row()
+    def convert_to_simulator(self) -> circuit:
+        """
+        Convert circuit to 'circuit' simulator object
 
-        return CIRCUIT
+        :return: 'circuit' object
+        """
+        with profiler.span("conversion", category="gui"):
+            return build_circuit(self.size, self.get_records())
 
     def _init_size_(self, circuit_size: int) -> list:
         """
@@ -319,6 +292,10 @@ class circuit_frame(Frame):
         # Initialize sub-frames (qubit lines)
         self.LINES = self._init_size_(circuit_size)
 
+        # First line shown (only max_visible_lines lines are shown at once, see dimensions.py)
+        self.offset = 0
+        self.scrollbar = None
+
     def clear(self):
         """ Clear circuit of all widgets """
 
@@ -329,17 +306,68 @@ class circuit_frame(Frame):
 
     def place(self, **kwargs):
         """
-        Packing function (packs all sub-frames as well)
+        Packing function (packs all sub-frames as well, and the scrollbar if not all lines can be shown)
 
         :param kwargs: parameters to be passed on to tkinter Frame.pack() method
         """
 
         # Pack sub-frames
-        for i, line in enumerate(self.LINES):
-            line.place(x=0, y=cir_line_height * i)
+        self._place_lines()
 
         super().place(**kwargs)
 
+        if self.size > max_visible_lines:
+            self.scrollbar = Scrollbar(self.master, orient=VERTICAL, command=self.yview)
+            self.scrollbar.place(x=kwargs.get("x", 0) + cir_frame_width, y=kwargs.get("y", 0),
+                                 width=scrollbar_width, height=cir_frame_height(self.size))
+            self._update_scrollbar()
+
+            # Mouse wheel (windows/macOS, linux)
+            self.master.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+            self.master.bind("<Button-4>", lambda _: self.scroll(-1))
+            self.master.bind("<Button-5>", lambda _: self.scroll(1))
+
+    def shown_lines(self) -> range:
+        """ Line numbers currently shown, from top to bottom """
+        return range(self.offset, self.offset + visible_lines(self.size))
+
+    def _place_lines(self) -> None:
+        """ Place visible sub-frames, hide the others """
+        for i, line in enumerate(self.LINES):
+            if i in self.shown_lines():
+                line.place(x=0, y=cir_line_height * (i - self.offset))
+            else:
+                line.place_forget()
+
+    def _update_scrollbar(self) -> None:
+        if self.scrollbar is not None:
+            self.scrollbar.set(self.offset / self.size, (self.offset + visible_lines(self.size)) / self.size)
+
+    def scroll_to(self, offset: int) -> None:
+        """
+        Show lines from the given one
+
+        :param offset: first line to be shown
+        """
+        offset = max(0, min(offset, self.size - visible_lines(self.size)))
+
+        if offset != self.offset:
+            self.offset = offset
+            self._place_lines()
+            self._update_scrollbar()
+
+    def scroll(self, lines: int) -> None:
+        """ Scroll by the given number of lines """
+        self.scroll_to(self.offset + lines)
+
+    def yview(self, *args) -> None:
+        """ Scrollbar command ('moveto', fraction) or ('scroll', amount, 'units'/'pages') """
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * self.size))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            self.scroll(amount * visible_lines(self.size) if args[2] == "pages" else amount)
+
     def minimize(self):
         """ Minimize all qubits/lines animations """
         for line in self.LINES:
@@ -538,6 +566,88 @@ class circuit_frame(Frame):
 
         self.master.update_plot()
 
+    def _place_complex(self, target_n: int, control_n: int, gate_n: int, gate) -> bool:
+        """
+        Place a 'complex' gate (target and control widgets), if both locations are free
+
+        :param target_n: target line number
+        :param control_n: control line number
+        :param gate_n: gate number
+        :param gate: gate dragableButton object
+        :return: has the gate been placed?
+        """
+
+        master_targ = self.LINES[target_n]
+        master_cont = self.LINES[control_n]
+
+        if not (master_targ.can_add_gate(gate_n) and master_cont.can_add_gate(gate_n)):
+            return False
+
+        wid_targ = DynamicButton(master=master_targ,
+                                 gate=gate.name,
+                                 font=("Helvetica", 12, "bold"),
+                                 cursor="pirate",
+                                 bg=gate.color,
+                                 coor=(target_n, gate_n),
+                                 command_tuple=(self.rm_func, ((master_targ, master_cont), gate_n)))
+        wid_cont = DynamicButton(master=master_cont,
+                                 gate="A",
+                                 font=("Times", 13, "bold"),
+                                 cursor="sb_v_double_arrow",
+                                 bg="cornsilk3",
+                                 coor=(control_n, gate_n),
+                                 command_tuple=(self.invert_func, ((master_targ, master_cont), gate_n)))
+        wid_cont.BIND("<Button-3>", self.right_click)
+
+        master_targ.place_gate(gate_n, wid_targ)
+        master_cont.place_gate(gate_n, wid_cont)
+        return True
+
+    def _place_simple(self, line_n: int, gate_n: int, gate) -> bool:
+        """
+        Place a 'simple' gate widget, if the location is free
+
+        :param line_n: line number
+        :param gate_n: gate number
+        :param gate: gate dragableButton object
+        :return: has the gate been placed?
+        """
+
+        master = self.LINES[line_n]
+
+        if not master.can_add_gate(gate_n):
+            return False
+
+        wid = DynamicButton(master=master,
+                            gate=gate.name,
+                            font=("Helvetica", 12, "bold"),
+                            cursor="pirate",
+                            bg=gate.color,
+                            coor=(line_n, gate_n),
+                            command_tuple=(self.rm_func, ((master,), gate_n)))
+
+        master.place_gate(gate_n, wid)
+        return True
+
+    def load_records(self, records: list or tuple, gate_widgets: dict) -> None:
+        """
+        Replace the circuit by the given gate records (see get_records)
+
+        :param records: list of (gate name, column, target line, control line or None)
+        :param gate_widgets: gate name -> dragableButton object (gate type and color)
+        """
+
+        for i in range(gate_n_per_line):
+            self.remove_gate(self.LINES, i)
+
+        for name, column, target, control in records:
+            if control is None:
+                self._place_simple(target, column, gate_widgets[name])
+            else:
+                self._place_complex(target, control, column, gate_widgets[name])
+
+        self.master.update_plot()
+
     def add_gate_to_circuit(self, line_n: int, gate_n: int, gate):
         """
         Add gate widget to specified line and gate
@@ -553,43 +663,8 @@ class circuit_frame(Frame):
             if line_n == len(self.LINES) - 1:
                 pass
 
-            else:
-                master_targ = self.LINES[line_n]
-                master_cont = self.LINES[line_n + 1]
-
-                if master_targ.can_add_gate(gate_n) and master_cont.can_add_gate(gate_n):
-
-                    wid_targ = DynamicButton(master=master_targ,
-                                             gate=gate.name,
-                                             font=("Helvetica", 12, "bold"),
-                                             cursor="pirate",
-                                             bg=gate.color,
-                                             coor=(line_n, gate_n),
-                                             command_tuple=(self.rm_func, ((master_targ, master_cont), gate_n)))
-                    wid_cont = DynamicButton(master=master_cont,
-                                             gate="A",
-                                             font=("Times", 13, "bold"),
-                                             cursor="sb_v_double_arrow",
-                                             bg="cornsilk3",
-                                             coor=(line_n + 1, gate_n),
-                                             command_tuple=(self.invert_func, ((master_targ, master_cont), gate_n)))
-                    wid_cont.BIND("<Button-3>", self.right_click)
-
-                    master_targ.place_gate(gate_n, wid_targ)
-                    master_cont.place_gate(gate_n, wid_cont)
-
-                    self.master.update_plot()
-
-        else:
-            master = self.LINES[line_n]
-            wid = DynamicButton(master=master,
-                                gate=gate.name,
-                                font=("Helvetica", 12, "bold"),
-                                cursor="pirate",
-                                bg=gate.color,
-                                coor=(line_n, gate_n),
-                                command_tuple=(self.rm_func, ((master,), gate_n)))
-
-            master.place_gate(gate_n, wid)
+            elif self._place_complex(line_n, line_n + 1, gate_n, gate):
+                self.master.update_plot()
 
+        elif self._place_simple(line_n, gate_n, gate):
             self.master.update_plot()
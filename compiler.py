@@ -0,0 +1,221 @@
+import numpy as np
+
+from circuit import circuit
+from gates import Gate, gates
+from profiler import profiler
+
+
+"""
+
+Compilation passes, applied on the 'circuit' object produced by circuit_frame.convert_to_simulator before simulation.
+
+Gate cancellation (peephole):
+    A gate directly following the same gate on the same line(s) (nothing in between on these lines) is merged with it
+    according to the simplification table below: self-inverse pairs (H.H, X.X, CX.CX with same control/target..) are
+    removed, S.S becomes Z, sqrt.sqrt becomes X, and so on (S.S.S.S thus vanishes entirely). Identity gates are
+    removed as well.
+
+Single-qubit gate fusion:
+    Consecutive 'simple' gates on the same line are merged into a single 2x2 matrix (dot products of 2x2 matrices),
+    a run of gates thus costs one gate application instead of one per gate. A run stops whenever a 'complex' gate
+    uses the line (as control or target). Runs merging into the identity are removed.
+
+Both passes move gates across columns (a fused run is placed at the column of its last gate, a cancelled pair removes
+a gate from an earlier column), operations on a line staying in column order. Each merge of gates of different
+columns can be recorded as a (first column, last column) span: the state after a column no span crosses is the same
+before and after compilation, which is where the prefix cache keeps states (see cache.PrefixCache).
+
+"""
+
+
+# (first gate, second gate): resulting gate, None for the identity
+simplifications = {
+    ("X", "X"): None,
+    ("Y", "Y"): None,
+    ("Z", "Z"): None,
+    ("H", "H"): None,
+    ("S", "S"): "Z",
+    ("sqrt", "sqrt"): "X",
+
+    ("CX", "CX"): None,
+    ("CY", "CY"): None,
+    ("CZ", "CZ"): None,
+    ("CH", "CH"): None,
+    ("CS", "CS"): "CZ",
+}
+
+# Controlled gates for which control and target can be exchanged
+symmetric_gates = ("CZ", "CS")
+
+
+def _lines(index: int or list or tuple) -> tuple:
+    """ Lines used by an operation """
+    if type(index) is int:
+        return (index,)
+    return tuple(index)
+
+
+def _same_lines(gate_a, index_a, gate_b, index_b) -> bool:
+    """ Do both operations act on the same lines, in the same way (control/target)? """
+    index_a, index_b = _lines(index_a), _lines(index_b)
+
+    if gate_a.name in symmetric_gates and gate_b.name in symmetric_gates:
+        return sorted(index_a) == sorted(index_b)
+    return index_a == index_b
+
+
+def cancel_gates(operations: list, spans: list = None) -> tuple:
+    """
+    Remove/merge consecutive gates according to the simplifications table.
+
+    :param operations: list of (gate, index, column) operations (see circuit.add_gate)
+    :param spans: list the (first column, last column) of merged gates of different columns are appended to
+
+    :return: (new list of operations, number of gates removed)
+    """
+
+    result = []
+    # Positions (in result) of the operations applied on each line
+    stacks = {}
+    removed = 0
+
+    def push(gate, index, column):
+        nonlocal removed
+
+        if gate.name == "I":
+            removed += 1
+            return
+
+        lines = _lines(index)
+
+        # Last operation on the lines, which must be the same for all of them
+        previous = {stacks[line][-1] if stacks.get(line) else None for line in lines}
+
+        if len(previous) == 1 and None not in previous:
+            position = previous.pop()
+            prev_gate, prev_index, prev_column = result[position]
+
+            if (prev_gate.name, gate.name) in simplifications and _same_lines(prev_gate, prev_index, gate, index):
+                if spans is not None and prev_column != column:
+                    spans.append((prev_column, column))
+
+                result[position] = None
+                for line in lines:
+                    stacks[line].pop()
+
+                merged = simplifications[(prev_gate.name, gate.name)]
+
+                if merged is None:
+                    removed += 2
+                else:
+                    # The merged gate may itself simplify with the operation before it
+                    removed += 1
+                    push(gates[merged], prev_index, column)
+                return
+
+        result.append((gate, index, column))
+        for line in lines:
+            stacks.setdefault(line, []).append(len(result) - 1)
+
+    for gate, index, column in operations:
+        push(gate, index, column)
+
+    return [operation for operation in result if operation is not None], removed
+
+
+def fuse_single_qubit_gates(operations: list, size: int, spans: list = None) -> list:
+    """
+    Merge runs of consecutive single-qubit gates on each line.
+
+    :param operations: list of (gate, index, column) operations (see circuit.add_gate)
+    :param size: circuit size
+    :param spans: list the (first column, last column) of runs over several columns are appended to
+
+    :return: new list of operations
+    """
+
+    fused = []
+    # Run of (simple gate, column) not yet added, for each line
+    pending = [[] for _ in range(size)]
+
+    def flush(line):
+        """ Add the pending run of the given line to the fused operations (at the column of its last gate) """
+        run = pending[line]
+
+        if len(run) == 1:
+            fused.append((run[0][0], line, run[0][1]))
+
+        elif len(run) > 1:
+            if spans is not None and run[0][1] != run[-1][1]:
+                spans.append((run[0][1], run[-1][1]))
+
+            mat = run[0][0].mat
+            for gate, _ in run[1:]:
+                mat = np.dot(gate.mat, mat)
+
+            if not np.allclose(mat, np.eye(2)):
+                fused.append((Gate(mat), line, run[-1][1]))
+
+        pending[line] = []
+
+    for gate, index, column in operations:
+        if type(index) is int:
+            pending[index].append((gate, column))
+        else:
+            # Complex gate, runs on its lines must be applied before it
+            for line in index:
+                flush(line)
+            fused.append((gate, index, column))
+
+    for line in range(size):
+        flush(line)
+
+    return fused
+
+
+def compile_operations(operations: list, size: int, spans: list = None, fuse: bool = True) -> tuple:
+    """
+    Apply all compilation passes on a list of operations
+
+    :param operations: list of (gate, index, column) operations (see circuit.add_gate)
+    :param size: circuit size
+    :param spans: list the (first column, last column) of gates merged across columns are appended to
+    :param fuse: fuse single-qubit gates (fused gates are unnamed)
+    :return: (new list of operations, number of gates removed by cancellation)
+    """
+
+    with profiler.span("cancellation") as info:
+        operations, removed = cancel_gates(operations, spans)
+        info["removed"] = removed
+
+    with profiler.span("fusion") as info:
+        fused = fuse_single_qubit_gates(operations, size, spans) if fuse else operations
+        info["fused"] = len(operations) - len(fused)
+
+    return fused, removed
+
+
+def compile_circuit(CIRCUIT: circuit) -> tuple:
+    """
+    Apply all compilation passes on a circuit
+
+    :param CIRCUIT: 'circuit' object
+    :return: (new 'circuit' object equivalent to the given one, number of gates removed by cancellation)
+    """
+
+    # Circuits simulated on a stabilizer tableau need named gates, they are not fused
+    fused, removed = compile_operations(CIRCUIT.operations, CIRCUIT.size,
+                                        fuse=not (CIRCUIT.backend == "stabilizer" or CIRCUIT.uses_stabilizer()))
+
+    compiled = circuit(CIRCUIT.size, backend=CIRCUIT.backend)
+    compiled.set_initial_state(CIRCUIT.initial_state)
+    compiled.set_storage(CIRCUIT.storage)
+    compiled.set_processes(CIRCUIT.processes)
+    compiled.set_precision(CIRCUIT.precision)
+    compiled.set_truncation(CIRCUIT.max_bond, CIRCUIT.cutoff)
+    compiled.stabilizer_dispatch = CIRCUIT.stabilizer_dispatch
+
+    for gate, index, column in fused:
+        compiled.add_gate(gate, index, column)
+
+    return compiled, removed
@@ -23,10 +23,16 @@ cir_line_width = bd * 2 + gate_n_per_line * gate_width
 # 60
 cir_line_height = bd * 2 + gate_height
 
+# Lines shown at once in the circuit frame (scrollable beyond)
+max_visible_lines = 6
+visible_lines = lambda lines_n: min(lines_n, max_visible_lines)
+
 # 866
 cir_frame_width = bd * 2 + cir_line_width
 # 188
-cir_frame_height = lambda lines_n: bd * 2 + cir_line_height * lines_n
+cir_frame_height = lambda lines_n: bd * 2 + cir_line_height * visible_lines(lines_n)
+
+scrollbar_width = 16
 
 wid_frame_height = 150
 # 866
@@ -132,10 +132,10 @@ class DragableWidget(Button):
 
             IN = False
 
-            # For all existing lines (qubits)
-            for i in range(self.circuit.size):
+            # For all lines (qubits) currently shown
+            for k, i in enumerate(self.circuit.shown_lines()):
 
-                top = cir_y + bd + (i * cir_line_height)
+                top = cir_y + bd + (k * cir_line_height)
                 btm = top + cir_line_height
 
                 # Is located in Y drag-n-drop area ?
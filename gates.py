@@ -23,18 +23,61 @@ def kron(*mat):
 """ ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### """
 
 
+def get_structure(mat: np.ndarray) -> str:
+    """
+    Structure of a gate matrix:
+        'diagonal' -> only phases on the diagonal (Z, S ..)
+        'permutation' -> one non-zero element per row and column, off the diagonal (X, and Y up to phases)
+        'dense' -> any other matrix (H ..)
+    """
+    mat = np.asarray(mat)
+
+    if mat.ndim != 2:
+        return "dense"
+    if np.count_nonzero(mat - np.diag(np.diag(mat))) == 0:
+        return "diagonal"
+    if all(np.count_nonzero(mat, axis=axis).max() == 1 for axis in (0, 1)):
+        return "permutation"
+    return "dense"
+
+
+""" ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### """
+
+
 class Gate(object):
 
-    def __init__(self, mat: np.ndarray, activators=None, name=None):
-        """ Gate object """
-        self.mat = mat
+    def __init__(self, mat: np.ndarray, activators=None, name=None, structure=None):
+        """
+        Gate object
+
+        :param mat: gate matrix (target matrix for controlled gates)
+        :param activators: |0><0| and |1><1| activators of controlled gates
+        :param name: gate name
+        :param structure: 'diagonal', 'permutation' or 'dense' (see get_structure), deduced from mat if None
+        """
+        # Always stored in double precision, other precisions are derived from it (see matrix)
+        self.mat = np.asarray(mat, dtype=np.complex128)
         self.activators = activators
 
         self.name = name
+        self.structure = structure if structure is not None else get_structure(self.mat)
+
+        # dtype -> gate matrix in that dtype
+        self.matrices = {}
 
     def get_mat(self):
         return self.mat.copy()
 
+    def matrix(self, dtype) -> np.ndarray:
+        """ Gate matrix in the given (complex) dtype, converted once """
+        dtype = np.dtype(dtype)
+
+        if dtype == self.mat.dtype:
+            return self.mat
+        if dtype not in self.matrices:
+            self.matrices[dtype] = self.mat.astype(dtype)
+        return self.matrices[dtype]
+
 
 """ ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### ##### """
 
@@ -44,25 +87,25 @@ _1 = Gate(np.array([0, 1]), name="1")
 
 # Identity matrix
 _I = Gate(np.array([[1, 0],
-                    [0, 1]]))
+                    [0, 1]]), name="I", structure="diagonal")
 
 # Pauli matrices
 _X = Gate(np.array([[0, 1],
-                    [1, 0]]))
+                    [1, 0]]), name="X", structure="permutation")
 _Y = Gate(np.array([[0, -1j],
-                    [1j, 0]]))
+                    [1j, 0]]), name="Y", structure="permutation")
 _Z = Gate(np.array([[1, 0],
-                    [0, -1]]))
+                    [0, -1]]), name="Z", structure="diagonal")
 
 # phase gate
 _S = Gate(np.array([[1, 0],
-                    [0, 1j]]))
+                    [0, 1j]]), name="S", structure="diagonal")
 # square root of X
 _sqrt = Gate(1/2 * np.array([[1+1j, 1-1j],
-                             [1-1j, 1+1j]]))
+                             [1-1j, 1+1j]]), name="sqrt", structure="dense")
 # Hadamard
 _H = Gate(1/np.sqrt(2) * np.array([[1, 1],
-                                   [1, -1]]))
+                                   [1, -1]]), name="H", structure="dense")
 
 # CNOT / controlled-X gate
 _CX = Gate(np.array([[0, 1],   # X gate
@@ -70,35 +113,40 @@ _CX = Gate(np.array([[0, 1],   # X gate
            np.array([[[1, 0],  # |0> <0| activator
                       [0, 0]],
                      [[0, 0],  # |1> <1| activator
-                      [0, 1]]]))
+                      [0, 1]]]),
+           name="CX", structure="permutation")
 # controlled-Y
 _CY = Gate(np.array([[0, -1j], # Y gate
                     [1j, 0]]),
            np.array([[[1, 0],  # |0> <0| activator
                       [0, 0]],
                      [[0, 0],  # |1> <1| activator
-                      [0, 1]]]))
+                      [0, 1]]]),
+           name="CY", structure="permutation")
 # controlled-Z
 _CZ = Gate(np.array([[1, 0],   # Z gate
                     [0, -1]]),
            np.array([[[1, 0],  # |0> <0| activator
                       [0, 0]],
                      [[0, 0],  # |1> <1| activator
-                      [0, 1]]]))
+                      [0, 1]]]),
+           name="CZ", structure="diagonal")
 # controlled-H
 _CH = Gate(1/np.sqrt(2) * np.array([[1, 1],  # H gate
                                    [1, -1]]),
            np.array([[[1, 0],  # |0> <0| activator
                       [0, 0]],
                      [[0, 0],  # |1> <1| activator
-                      [0, 1]]]))
+                      [0, 1]]]),
+           name="CH", structure="dense")
 # controlled-S
 _CS = Gate(np.array([[1, 0],   # S gate
                     [0, 1j]]),
            np.array([[[1, 0],  # |0> <0| activator
                       [0, 0]],
                      [[0, 0],  # |1> <1| activator
-                      [0, 1]]]))
+                      [0, 1]]]),
+           name="CS", structure="diagonal")
 
 gates = {
     "0": _0,
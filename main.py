@@ -1,10 +1,11 @@
 
 from tkinter import *
 from tkinter import messagebox as mb
+from tkinter import filedialog
 
-import itertools as itl
-from time import time
+import traceback
 
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
@@ -12,6 +13,14 @@ from tkManagementFuncs import *
 
 from dragableWidget import DragableWidget
 from circuitFrame import circuit_frame
+from circuit import estimate_cost, top_states
+from qcs import bitstring
+from compiler import compile_circuit, compile_operations
+from cache import PrefixCache
+from worker import SimulationWorker
+import planner
+from profiler import profiler
+import circuitFile
 
 from dimensions import *
 
@@ -61,8 +70,26 @@ Variable / terms naming within hasn't been the most thorough, namely for:
 
 class window(Tk):
 
+    # Delay (ms) before a requested update starts, further requests within this delay collapse into one simulation
+    update_delay = 50
+    # Delay (ms) between two checks of the background simulation results
+    poll_delay = 20
+
+    # Largest circuit that can be created
+    max_size = 12
+    # Most bars in the plot (64 -> all states up to 6 qubits)
+    max_bars = 64
+    # Simulation precision, single precision is plenty for the plots (see circuit.precision_error_bound)
+    precision = "single"
+    # Above these estimates (see circuit.estimate_cost) creating a circuit asks for confirmation, the memory being
+    # the budget of the backend planner as well (see planner.py)
+    max_update_time = 0.5
+    max_update_memory = 2 ** 30
+
     def QUIT(self):
         """ Quit function """
+        # Stop background simulation
+        self.worker.stop()
         # Quit tkinter window
         self.destroy()
         # Force quit python if any unexpected errors occurs
@@ -71,47 +98,222 @@ class window(Tk):
     def update_plot(self, button_call=False) -> None:
         """
         Call after circuit change in order to update the plot accordingly (will only plot dynamically
-        if self.dynamic_plotting is activated)
+        if self.dynamic_plotting is activated).
+        The simulation itself runs in the background (see _start_simulation), calls in quick succession
+        result in a single simulation.
 
         :param button_call: force plot change (when using button call instead of dynamic plotting)
         """
 
         if self.dynamic_plotting.get() or button_call:
 
-            start_gen = time()
-            CIRCUIT = self.FRAME_circuit.convert_to_simulator()
-            end_gen = time()
+            if self.pending_update is not None:
+                self.after_cancel(self.pending_update)
+
+            self.pending_update = self.after(self.update_delay, self._start_simulation)
+
+    def _start_simulation(self) -> None:
+        """ Snapshot the circuit and send its simulation to the background worker (cancelling any running one) """
+
+        self.pending_update = None
+
+        SNAPSHOT = self.FRAME_circuit.convert_to_simulator()
+        SNAPSHOT.set_precision(self.precision)
+
+        shots = self._get_shots()
+
+        def simulate(cancel):
+            """ Background job, must not touch any tkinter object """
+            with profiler.span("update", shots=shots) as info:
+                # Fastest backend for this circuit
+                decision = planner.plan(SNAPSHOT, self.max_update_memory)
+                planner.apply_plan(SNAPSHOT, decision)
+                info["plan"] = decision.as_dict()
+
+                if SNAPSHOT.backend == "statevector":
+                    # The prefix cache compiles the columns it recomputes (see cache.PrefixCache)
+                    CIRCUIT = SNAPSHOT
+                    CIRCUIT.set_prefix_cache(self.prefix_cache)
+                else:
+                    with profiler.span("compilation"):
+                        CIRCUIT, info["removed_gates"] = compile_circuit(SNAPSHOT)
+                CIRCUIT.set_cancel_event(cancel)
+
+                # All 2^n states, the shown ones are selected when plotting (see _plot_view)
+                if shots:
+                    # Sampled histogram (in percentage of the shots)
+                    probs = CIRCUIT.get_counts(shots) / shots * 100
+                else:
+                    probs = CIRCUIT.get_probabilities(percentage=True)
+
+                if CIRCUIT.prefix_cache is not None:
+                    info["reused_columns"] = self.prefix_cache.reused_columns
+                    info["removed_gates"] = self.prefix_cache.removed_gates
+                return probs
+
+        self.worker.submit(simulate)
+
+    def _poll_simulation(self) -> None:
+        """ Plot the newest background simulation result if any (runs periodically on the main loop) """
+
+        result = self.worker.poll()
+
+        if result is not None:
+            _, probs, error = result
+
+            if error is not None:
+                traceback.print_exception(error)
+            else:
+                self.probabilities = probs
+                self._set_plot(probs)
+
+        self.after(self.poll_delay, self._poll_simulation)
+
+    def save_circuit(self) -> None:
+        """ Save the circuit to a file (format from the extension, see circuitFile.py) """
+
+        path = filedialog.asksaveasfilename(title="Save circuit", defaultextension=".json",
+                                            filetypes=[("Circuit JSON", "*.json"), ("Packed circuit", "*.qcb")])
+        if path:
+            circuitFile.save(path, self.size, self.FRAME_circuit.get_records())
+
+    def load_circuit(self) -> None:
+        """ Replace the circuit by the (first) circuit of a file """
+
+        path = filedialog.askopenfilename(title="Load circuit",
+                                          filetypes=[("Circuit files", "*.json *.jsonl *.qcb"), ("All files", "*")])
+        if not path:
+            return
+
+        try:
+            size, records = circuitFile.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            mb.showerror("Load error", "Could not read '{}':\n{}".format(path, e))
+            return
+
+        if size > self.size:
+            mb.showerror("Load error", "The circuit has {} qubits, but the current circuit only has {}."
+                         .format(size, self.size))
+            return
+
+        if any(column >= gate_n_per_line for _, column, _, _ in records):
+            mb.showerror("Load error", "The circuit has more than {} columns.".format(gate_n_per_line))
+            return
+
+        unknown = {name for name, _, _, _ in records if name not in self.gate_widgets}
+        if unknown:
+            mb.showerror("Load error", "Gates not available in the editor: {}".format(", ".join(sorted(unknown))))
+            return
+
+        self.FRAME_circuit.load_records(records, self.gate_widgets)
+
+    def toggle_profiling(self) -> None:
+        """ Start recording profiling events, or stop and export them as a Chrome trace file """
+
+        if self.profiling.get():
+            profiler.clear()
+            profiler.enable(memory=True)
+            return
+
+        profiler.disable()
+        path = filedialog.asksaveasfilename(title="Save profiling trace", initialfile="trace.json",
+                                            defaultextension=".json", filetypes=[("Chrome trace", "*.json")])
+        if path:
+            profiler.export(path)
+
+    def _get_shots(self) -> int:
+        """ Number of shots to sample (0 or invalid entry -> exact probabilities) """
+        try:
+            return max(int(self.shots.get()), 0)
+        except ValueError:
+            return 0
+
+    def _get_top(self) -> int:
+        """ Number of states to show (invalid entry -> as many as there are bars) """
+        try:
+            return min(max(int(self.top.get()), 1), len(self.bars))
+        except ValueError:
+            return len(self.bars)
+
+    def _get_threshold(self) -> float:
+        """ Minimum probability (in percentage) of the shown states (invalid entry -> 0) """
+        try:
+            return max(float(self.threshold.get()), 0.)
+        except ValueError:
+            return 0.
+
+    def refresh_plot(self) -> None:
+        """ Plot the last simulation results again (after a view change, no new simulation) """
+        if self.probabilities is not None:
+            self._set_plot(self.probabilities)
+
+    def _plot_view(self, probabilities: np.ndarray) -> tuple:
+        """
+        Labels and widths of the bars (from bottom to top): all states in binary order if they fit in the plot and
+        no threshold is set, else the top k states above the threshold, most probable at the top.
+        Labels are only built for the shown states.
+
+        :param probabilities: probabilities (in percentage) of all 2^n states
+        :return: (labels, widths)
+        """
+
+        top, threshold = self._get_top(), self._get_threshold()
+
+        if top >= len(probabilities) and threshold == 0:
+            indices = range(len(probabilities))
+        else:
+            indices = top_states(probabilities, top, threshold)[::-1]
+
+        # Unused bars (fewer states than bars) are left empty at the bottom
+        empty = len(self.bars) - len(indices)
+        labels = [""] * empty + [bitstring(i, self.size) for i in indices]
+        widths = [0] * empty + [probabilities[i] for i in indices]
 
-            start_sim = time()
-            probs = CIRCUIT.get_probabilities(self.measurement_states, percentage=True)
-            end_sim = time()
-            print("[Updated simulation] - Circuit generation took: {}s "
-                  "| Circuit simulation took {}s".format(round(end_gen - start_gen, 5), round(end_sim - start_sim, 5)))
-            self._set_plot(probs)
+        return labels, widths
 
     def _set_plot(self, y_data: list or tuple) -> None:
         """
         Updates the plot to the given y data
 
-        :param y_data: probability data
+        :param y_data: probability data (all 2^n states)
         """
 
-        self.ax.clear()
+        with profiler.span("plot draw", category="gui"):
+            self._draw_plot(*self._plot_view(y_data))
 
-        self.ax.barh(self.measurement_states, y_data, height=0.9)
+    def _draw_plot(self, labels: list, widths: list) -> None:
+        """
+        See _set_plot, only the bar widths change: the bars are redrawn over the cached background (blitting).
+        A full draw is only needed when the shown states (tick labels) change.
+        """
 
-        size = self.size
-        self.ax.tick_params(axis='y', which='major', labelsize=6 + (6 - size))
-        self.ax.margins(x=0, y=0)
-        self.fig.subplots_adjust(left=0.1, right=0.95, top=0.99, bottom=0.05 * (1 + 1 / 7 * (7 - size)))
+        for bar, width in zip(self.bars, widths):
+            bar.set_width(width)
 
-        self.ax.set_xticks([i * 10 for i in range(11)])
-        self.ax.set_xticklabels([str(i * 10) for i in range(11)])
+        if labels != self.plot_labels:
+            self.plot_labels = labels
+            self.ax.set_yticklabels(labels)
+            self.plot_canva.draw_idle()
+            return
 
-        self.ax.grid(axis="x", alpha=0.5, dashes=(3, 1))
-        self.ax.set_axisbelow(True)
+        if self.plot_background is None:
+            # Background not rendered yet, the next full draw includes the bars (see _on_plot_draw)
+            self.plot_canva.draw_idle()
+            return
 
-        self.plot_canva.draw()
+        self.plot_canva.restore_region(self.plot_background)
+        self._draw_bars()
+        self.plot_canva.blit(self.fig.bbox)
+
+    def _draw_bars(self) -> None:
+        """ Render the (animated) bars on the canvas renderer """
+        for bar in self.bars:
+            self.ax.draw_artist(bar)
+
+    def _on_plot_draw(self, event) -> None:
+        """ After every full figure draw (first draw, resizing ..): cache the background and add the bars to it """
+        self.plot_background = self.plot_canva.copy_from_bbox(self.fig.bbox)
+        self._draw_bars()
 
     def _init_plot_(self):
         """ Initialize the plot """
@@ -121,19 +323,59 @@ class window(Tk):
 
         self.fig, self.ax = plt.subplots()
 
+        self.fig.set_facecolor("#F0F0F0")
+        self.ax.set_facecolor("#F0F0F0")
+
+        # Bars are created once and only their widths change afterwards (see _draw_plot). They are 'animated', i.e.
+        # left out of full figure draws and drawn over the cached background instead
+        # At most max_bars bars, larger circuits only show their top states (see _plot_view)
+        bars_amount = min(2 ** self.size, self.max_bars)
+        self.bars = self.ax.barh(range(bars_amount), [0] * bars_amount, height=0.9, animated=True)
+        self.ax.set_yticks(range(bars_amount))
+        self.plot_labels = None
+        self.probabilities = None
+
+        size = min(self.size, 6)
+        self.ax.tick_params(axis='y', which='major', labelsize=6 + (6 - size))
+        self.ax.margins(x=0, y=0)
+        self.fig.subplots_adjust(left=0.1 + 0.01 * max(self.size - 6, 0), right=0.95, top=0.99,
+                                 bottom=0.05 * (1 + 1 / 7 * (7 - size)))
+
+        self.ax.set_xlim(0, 100)
+        self.ax.set_xticks([i * 10 for i in range(11)])
+        self.ax.set_xticklabels([str(i * 10) for i in range(11)])
+
+        self.ax.grid(axis="x", alpha=0.5, dashes=(3, 1))
+        self.ax.set_axisbelow(True)
+
         # Plot canva inserted in tkinter
         self.plot_canva = FigureCanvasTkAgg(self.fig, master=plot_frame)
+        self.plot_background = None
+        self.plot_canva.mpl_connect("draw_event", self._on_plot_draw)
         self.plot_canva.draw()
 
         plot_frame.place(x=plt_win_x, y=plt_win_y)
         self.plot_canva.get_tk_widget().place(x=0, y=0, width=plt_win_width, height=plt_win_height(self.size))
 
-        self.fig.set_facecolor("#F0F0F0")
-        self.ax.set_facecolor("#F0F0F0")
+        # Collect background simulation results
+        self._poll_simulation()
 
         # Initial update
         self.update_plot(button_call=True)
 
+    def _create_circuit(self) -> None:
+        """ Create a circuit of the size selected in the main menu """
+        try:
+            size = int(self.circuit_size.get())
+        except ValueError:
+            size = 0
+
+        if not 1 <= size <= self.max_size:
+            mb.showerror("Invalid size", "The circuit size must be between 1 and {}".format(self.max_size))
+            return
+
+        self._init_circuit_(size)
+
     def _init_circuit_(self, size: int) -> None:
         """
         Initialize circuit frame object and all dragable gates widgets.
@@ -141,24 +383,27 @@ class window(Tk):
         :param size: Size of the circuit
         """
 
-        if size > 5:
-            mb.showwarning("Size warning",
-                           "You are simulating a circuit with 6 qubits.\n"
-                           "Due to slow (unoptimised) simulator code I do not recommend to"
-                           " use dynamic plotting, for a smoother experience.")
+        # Worst case (every location filled) cost of a single simulation
+        time, memory = estimate_cost(size, size * gate_n_per_line, precision=self.precision)
+        if time > self.max_update_time or memory > self.max_update_memory:
+            if not mb.askyesno("Size warning",
+                               "A circuit with {} qubits may take up to {:.1f}s and {:.0f}MiB per simulation.\n"
+                               "Dynamic plotting is not recommended at this size. Continue?"
+                               .format(size, time, memory / 2 ** 20)):
+                return
 
         self.size = size
-        # Initialize all possible measurement states (used for plots)
-        self.measurement_states = ["".join(elt) for elt in itl.product("01", repeat=size)]
 
         # Change geometry accordingly to size chosen
         new_x = init_win_width + bd*2 + plt_win_width
-        new_y = cir_y + bb + bd*2 + size*cir_line_height + 30
+        new_y = cir_y + bb + bd*2 + visible_lines(size)*cir_line_height + 30
         self.geometry("{}x{}".format(new_x, new_y))
 
         self.FRAME_buttons.destroy()
 
         self.FRAME_circuit = circuit_frame(master=self, circuit_size=size)
+        # States after each column of the last simulation, reused by the next one
+        self.prefix_cache = PrefixCache(compile=compile_operations)
 
         """ ----- ----- ----- BUTTONS ----- ----- ----- """
 
@@ -181,6 +426,56 @@ class window(Tk):
         bindButtonHover(btn_clear, cl_leave="#F0F0F0")
         btn_clear.place(x=bb, y=new_y - 40)
 
+        # Number of shots (0 -> exact probabilities)
+        self.shots = StringVar(value="0")
+        lbl_shots = Label(self, text="Shots")
+        lbl_shots.place(x=bb + 140, y=new_y - 38)
+        box_shots = Spinbox(self, from_=0, to=10 ** 9, increment=1000, width=10,
+                            textvariable=self.shots,
+                            command=self.update_plot)
+        box_shots.bind("<Return>", lambda _: self.update_plot())
+        box_shots.place(x=bb + 185, y=new_y - 37)
+
+        btn_save = Button(self, text="Save circuit",
+                          height=1, width=12, relief="groove",
+                          command=self.save_circuit)
+        bindButtonHover(btn_save, cl_leave="#F0F0F0")
+        btn_save.place(x=bb + 310, y=new_y - 40)
+
+        btn_load = Button(self, text="Load circuit",
+                          height=1, width=12, relief="groove",
+                          command=self.load_circuit)
+        bindButtonHover(btn_load, cl_leave="#F0F0F0")
+        btn_load.place(x=bb + 420, y=new_y - 40)
+
+        self.profiling = IntVar()
+        btn_profiling = Checkbutton(self, text="Profiling",
+                                    variable=self.profiling,
+                                    onvalue=1, offvalue=0, height=1,
+                                    command=self.toggle_profiling)
+        btn_profiling.place(x=bb + 530, y=new_y - 40)
+
+        # Plot view: top k states, above a threshold (in percentage)
+        self.top = StringVar()
+        lbl_top = Label(self, text="Top")
+        lbl_top.place(x=plt_win_x, y=new_y - 38)
+        box_top = Spinbox(self, from_=1, to=min(2 ** size, self.max_bars), width=4,
+                          textvariable=self.top,
+                          command=self.refresh_plot)
+        box_top.bind("<Return>", lambda _: self.refresh_plot())
+        # Set after the Spinbox creation, which resets its variable to from_
+        self.top.set(str(min(2 ** size, self.max_bars)))
+        box_top.place(x=plt_win_x + 30, y=new_y - 37)
+
+        self.threshold = StringVar(value="0")
+        lbl_threshold = Label(self, text="Min %")
+        lbl_threshold.place(x=plt_win_x + 85, y=new_y - 38)
+        box_threshold = Spinbox(self, from_=0, to=100, increment=1, width=4,
+                                textvariable=self.threshold,
+                                command=self.refresh_plot)
+        box_threshold.bind("<Return>", lambda _: self.refresh_plot())
+        box_threshold.place(x=plt_win_x + 130, y=new_y - 37)
+
         """ ----- ----- ----- DRAGABLE GATES WIDGETS ----- ----- ----- """
 
         # Identity
@@ -231,6 +526,9 @@ class window(Tk):
                            gate="CS", width=4, height=2,
                            font=("Helvetica", 12, "bold"), bg="light sea green")
 
+        # Gate name -> dragable widget (used to rebuild loaded circuits)
+        self.gate_widgets = {wid.name: wid for wid in (I, X, Y, Z, H, S, CX, CY, CZ, CH, CS)}
+
         self.FRAME_circuit.place(x=cir_x, y=cir_y)
         self._init_plot_()
 
@@ -243,6 +541,10 @@ class window(Tk):
         self.lastWindow = "mainMenu"
         self.currently_editing = False
 
+        # Background simulation, and pending (not yet started) plot update
+        self.worker = SimulationWorker()
+        self.pending_update = None
+
         """ ######################################## """
         """ ############### APP INIT ############### """
         """ ######################################## """
@@ -278,15 +580,13 @@ class window(Tk):
 
         """ -------------------- BUTTONS -------------------- """
 
-        # is not defined by loop as it created problems somehow
-        BTN_1 = Button(self.FRAME_buttons, text="1", command=lambda: self._init_circuit_(1), width=10, relief="groove")
-        BTN_2 = Button(self.FRAME_buttons, text="2", command=lambda: self._init_circuit_(2), width=10, relief="groove")
-        BTN_3 = Button(self.FRAME_buttons, text="3", command=lambda: self._init_circuit_(3), width=10, relief="groove")
-        BTN_4 = Button(self.FRAME_buttons, text="4", command=lambda: self._init_circuit_(4), width=10, relief="groove")
-        BTN_5 = Button(self.FRAME_buttons, text="5", command=lambda: self._init_circuit_(5), width=10, relief="groove")
-        BTN_6 = Button(self.FRAME_buttons, text="6", command=lambda: self._init_circuit_(6), width=10, relief="groove")
+        self.circuit_size = Spinbox(self.FRAME_buttons, from_=1, to=self.max_size, width=5, justify=CENTER)
+        self.circuit_size.delete(0, END)
+        self.circuit_size.insert(0, "2")
+
+        BTN_create = Button(self.FRAME_buttons, text="Create", command=self._create_circuit, width=10, relief="groove")
 
-        CREATE_BUTTONS = [BTN_1, BTN_2, BTN_3, BTN_4, BTN_5, BTN_6]
+        CREATE_WIDGETS = [self.circuit_size, BTN_create]
 
         """##################################################"""
         """############### SLIDE WIDGETS INIT ###############"""
@@ -297,7 +597,7 @@ class window(Tk):
                            (LABEL_circuit_size, "place", {"x": cir_x, "y": cir_y})]
 
         # structure imported from other project, could have been simplified for the smaller scale of this one but I kept as it is
-        WIDGET_mainMenu += [(BUTTON, "pack", {"side": LEFT}) for i, BUTTON in enumerate(CREATE_BUTTONS)]
+        WIDGET_mainMenu += [(WIDGET, "pack", {"side": LEFT, "padx": 5}) for WIDGET in CREATE_WIDGETS]
         self.SLIDE_WIDGETS = {"mainMenu": WIDGET_mainMenu}
 
         # Binding all buttons to hover method
@@ -0,0 +1,131 @@
+import itertools as itl
+
+import numpy as np
+
+from statevector import as_tensor, _apply_operation, check_cancel
+from profiler import profiler
+
+
+"""
+
+Memory mapped statevector, for circuits whose amplitudes do not fit in memory (30 qubits -> 16 GiB of complex128).
+
+The 2^n amplitudes are kept in a file (np.memmap) and every gate is applied block by block: the most significant
+qubit axes the gate does not act on are fixed one value at a time, so that each block holds 2^chunk_qubits amplitudes
+and the gate only pairs amplitudes within it (see statevector.py). Blocks are made of long contiguous runs of the
+file, gates are streamed through it and only a block (and its temporaries) is in memory at once.
+
+Probabilities are read out chunk by chunk as well (see iter_probabilities, sampling.iter_chunk_counts).
+
+"""
+
+# Amplitudes per block: 2^chunk_qubits (16 MiB of complex128)
+chunk_qubits = 20
+
+
+def create(path: str, size: int, initial_state: np.ndarray = None, chunk: int = None,
+           dtype=np.complex128) -> np.memmap:
+    """
+    Create the amplitudes file of a circuit
+
+    :param path: amplitudes file (overwritten)
+    :param size: number of qubits
+    :param initial_state: initial amplitudes (copied chunk by chunk), |0...0> if None
+    :param chunk: qubits per block (chunk_qubits by default)
+    :param dtype: amplitudes dtype (complex64 or complex128)
+
+    :return: memory mapped amplitudes
+    """
+
+    # The new file is zero filled
+    state = np.memmap(path, dtype=dtype, mode="w+", shape=(2 ** size,))
+
+    if initial_state is None:
+        state[0] = 1
+    else:
+        step = 2 ** (chunk or chunk_qubits)
+        for start in range(0, len(state), step):
+            state[start:start + step] = initial_state[start:start + step]
+
+    return state
+
+
+def _blocks(size: int, qubits: tuple, chunk: int) -> tuple:
+    """
+    Blocks a gate can be applied on independently
+
+    :param size: number of qubits
+    :param qubits: lines the gate acts on
+    :param chunk: qubits per block
+
+    :return: (list of block indices, number of qubits of a block, qubits index remapping within a block)
+    """
+
+    free = [q for q in range(size) if q not in qubits]
+    fixed = free[:max(size - chunk, 0)]
+
+    blocks = []
+    for bits in itl.product((0, 1), repeat=len(fixed)):
+        index = [slice(None)] * size
+        for qubit, bit in zip(fixed, bits):
+            index[qubit] = bit
+        blocks.append(tuple(index))
+
+    remap = {q: q - sum(f < q for f in fixed) for q in qubits}
+
+    return blocks, size - len(fixed), remap
+
+
+def evolve(path: str, initial_state: np.ndarray or None, operations: list, size: int, cancel=None,
+           chunk: int = None, dtype=np.complex128) -> np.memmap:
+    """
+    Evolve a state through a list of operations, amplitudes being kept in a file.
+
+    :param path: amplitudes file (overwritten)
+    :param initial_state: initial amplitudes, |0...0> if None
+    :param operations: list of (gate, index, column) operations
+    :param size: number of qubits
+    :param cancel: threading.Event checked between blocks
+    :param chunk: qubits per block (chunk_qubits by default)
+    :param dtype: amplitudes dtype (complex64 or complex128)
+
+    :return: memory mapped final amplitudes
+    """
+
+    chunk = chunk or chunk_qubits
+
+    state = create(path, size, initial_state, chunk, dtype)
+    tensor = as_tensor(state, size)
+
+    for gate, index, _ in operations:
+        qubits = (index,) if type(index) is int else tuple(index)
+        blocks, block_size, remap = _blocks(size, qubits, chunk)
+
+        block_index = remap[index] if type(index) is int else tuple(remap[q] for q in index)
+
+        with profiler.span("contraction", gate=gate.name or "fused", index=str(index), blocks=len(blocks)):
+            for block in blocks:
+                check_cancel(cancel)
+                # View of the file, written in place
+                _apply_operation(tensor[block], gate, block_index, block_size)
+
+        profiler.count("gate " + (gate.name or "fused"))
+
+    state.flush()
+    return state
+
+
+def iter_probabilities(state: np.ndarray, chunk: int = None):
+    """
+    Stream the probabilities of (memory mapped or not) amplitudes
+
+    :param state: amplitudes
+    :param chunk: qubits per chunk (chunk_qubits by default)
+
+    :return: generator of (index of the first state, probabilities) chunks
+    """
+
+    step = 2 ** (chunk or chunk_qubits)
+
+    for start in range(0, len(state), step):
+        yield start, np.abs(state[start:start + step]) ** 2
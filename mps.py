@@ -0,0 +1,244 @@
+import numpy as np
+
+import sampling
+from profiler import profiler
+
+
+"""
+
+Matrix product state simulation, for wide but shallow (low entanglement) circuits.
+
+The state is a chain of n tensors of shape (left bond, 2, right bond), tensor q holding line q of the circuit, the
+amplitude of a bitstring b being the product of the matrices A_q[:, b_q, :]. Memory is O(n chi^2) instead of O(2^n),
+chi being the bond dimension, which stays small as long as the circuit creates little entanglement.
+
+The chain is kept in mixed canonical form: tensors left of the orthogonality center are left isometries, those right
+of it right isometries, so the singular values of a split at the center are the Schmidt coefficients of the state.
+Single qubit gates are applied on their tensor alone. Two qubit (controlled) gates are applied on neighbouring
+tensors: the center is moved to them (QR decompositions), both are contracted, the gate is applied, and the result is
+split back by a SVD, keeping at most max_bond singular values and dropping those whose weight (squared singular
+value) is below the cutoff. Gates on non neighbouring lines are brought together by swaps (and swapped back).
+
+The discarded weights are summed into truncation_error, which bounds 1 - fidelity with the exact state to first
+order (0 means the state is exact). The state is renormalized after each truncation.
+
+"""
+
+_SWAP = np.array([[1, 0, 0, 0],
+                  [0, 0, 1, 0],
+                  [0, 1, 0, 0],
+                  [0, 0, 0, 1]])
+
+
+def controlled_matrix(mat: np.ndarray, control_first: bool = True) -> np.ndarray:
+    """
+    4x4 matrix of a controlled 2x2 gate
+
+    :param mat: 2x2 target matrix
+    :param control_first: whether the control is the first (most significant) of the two qubits
+    """
+    result = np.eye(4, dtype=np.result_type(mat, np.complex64))
+
+    if control_first:
+        result[2:, 2:] = mat
+    else:
+        result[1::2, 1::2] = mat
+
+    return result
+
+
+class MPS(object):
+
+    def __init__(self, size: int, max_bond: int = 64, cutoff: float = 1e-12, dtype=np.complex128):
+        """
+        Matrix product state of |0...0>
+
+        :param size: number of qubits
+        :param max_bond: bond dimension cap (chi)
+        :param cutoff: singular values whose relative weight is below it are dropped
+        :param dtype: tensors dtype (complex64 or complex128)
+        """
+
+        self.size = size
+        self.max_bond = max_bond
+        self.cutoff = cutoff
+        self.dtype = dtype
+
+        self.tensors = []
+        for _ in range(size):
+            tensor = np.zeros((1, 2, 1), dtype=dtype)
+            tensor[0, 0, 0] = 1
+            self.tensors.append(tensor)
+
+        # Orthogonality center (see _move_center)
+        self.center = 0
+
+        # Sum of the discarded weights
+        self.truncation_error = 0.
+
+    def bond_dimensions(self) -> list:
+        """ Dimension of each of the n - 1 bonds """
+        return [tensor.shape[2] for tensor in self.tensors[:-1]]
+
+    """ ##### ##### ##### ##### ##### ##### """
+
+    def apply_gate(self, mat: np.ndarray, qubit: int) -> None:
+        """ Apply a 2x2 gate on the given line """
+        self.tensors[qubit] = np.einsum("ij,ajb->aib", mat.astype(self.dtype), self.tensors[qubit])
+
+    def _move_center(self, qubit: int) -> None:
+        """ Move the orthogonality center to the given tensor (QR decompositions along the way) """
+
+        while self.center < qubit:
+            tensor = self.tensors[self.center]
+            left, right = tensor.shape[0], tensor.shape[2]
+
+            q, r = np.linalg.qr(tensor.reshape(left * 2, right))
+            self.tensors[self.center] = q.reshape(left, 2, -1)
+            self.tensors[self.center + 1] = np.einsum("ab,bjc->ajc", r, self.tensors[self.center + 1])
+            self.center += 1
+
+        while self.center > qubit:
+            tensor = self.tensors[self.center]
+            left, right = tensor.shape[0], tensor.shape[2]
+
+            # LQ decomposition through the QR of the conjugate transpose
+            q, r = np.linalg.qr(tensor.reshape(left, 2 * right).conj().T)
+            self.tensors[self.center] = q.conj().T.reshape(-1, 2, right)
+            self.tensors[self.center - 1] = np.einsum("aib,bc->aic", self.tensors[self.center - 1], r.conj().T)
+            self.center -= 1
+
+    def _apply_neighbours(self, mat: np.ndarray, qubit: int) -> None:
+        """ Apply a 4x4 gate on lines qubit and qubit + 1 (qubit being the most significant) """
+
+        self._move_center(qubit)
+
+        theta = np.einsum("aib,bjc->aijc", self.tensors[qubit], self.tensors[qubit + 1])
+        theta = np.einsum("ijkl,aklc->aijc", mat.astype(self.dtype).reshape(2, 2, 2, 2), theta)
+
+        left, right = theta.shape[0], theta.shape[3]
+        u, s, vh = np.linalg.svd(theta.reshape(left * 2, 2 * right), full_matrices=False)
+
+        weights = s.astype(np.float64) ** 2
+        total = weights.sum()
+
+        keep = max(1, min(self.max_bond, int(np.count_nonzero(weights > self.cutoff * total))))
+        self.truncation_error += weights[keep:].sum() / total
+
+        s = s[:keep] / np.sqrt(weights[:keep].sum())
+
+        self.tensors[qubit] = u[:, :keep].reshape(left, 2, keep)
+        self.tensors[qubit + 1] = (s[:, None] * vh[:keep]).astype(self.dtype).reshape(keep, 2, right)
+        self.center = qubit + 1
+
+    def apply_two_qubit_gate(self, mat: np.ndarray, qubits: tuple) -> None:
+        """
+        Apply a 4x4 gate on any two lines (swapping them next to each other if needed)
+
+        :param mat: 4x4 gate matrix, qubits[0] being the most significant qubit
+        :param qubits: (first line index, second line index)
+        """
+
+        a, b = qubits
+        if a > b:
+            a, b = b, a
+            mat = _SWAP @ mat @ _SWAP
+
+        # Line b is brought next to line a, then put back
+        swaps = range(b - 1, a, -1)
+        for q in swaps:
+            self._apply_neighbours(_SWAP, q)
+
+        self._apply_neighbours(mat, a)
+
+        for q in reversed(swaps):
+            self._apply_neighbours(_SWAP, q)
+
+    def apply_operation(self, gate, index: int or list or tuple) -> None:
+        """
+        Apply a circuit operation, as stored by circuit.add_gate
+
+        :param gate: Gate object
+        :param index: line index for simple gates, (control, target) for complex gates
+        """
+
+        with profiler.span("contraction", gate=gate.name or "fused", index=str(index)):
+            if type(index) is int:
+                self.apply_gate(gate.mat, index)
+            else:
+                control, target = index
+                self.apply_two_qubit_gate(controlled_matrix(gate.mat, control < target),
+                                          (min(control, target), max(control, target)))
+
+    """ ##### ##### ##### ##### ##### ##### """
+
+    def amplitude(self, bitstring: str) -> complex:
+        """ Amplitude of a bitstring ('0'/'1' chars, first char being line 0) """
+
+        vector = np.ones(1, dtype=self.dtype)
+        for tensor, char in zip(self.tensors, bitstring):
+            vector = vector @ tensor[:, int(char), :]
+
+        return vector[0]
+
+    def probability(self, bitstring: str) -> float:
+        return float(np.abs(self.amplitude(bitstring)) ** 2)
+
+    def to_statevector(self) -> np.ndarray:
+        """ All 2^n amplitudes (binary order) """
+
+        state = np.ones((1, 1), dtype=self.dtype)
+        for tensor in self.tensors:
+            state = np.einsum("pa,abc->pbc", state, tensor).reshape(-1, tensor.shape[2])
+
+        return state[:, 0]
+
+    def _environments(self) -> list:
+        """ Norm matrices of the right parts of the chain: environment q is the contraction of tensors q.. n-1 """
+
+        environments = [np.ones((1, 1), dtype=self.dtype)]
+        for tensor in reversed(self.tensors):
+            right = environments[0]
+            environments.insert(0, np.einsum("aib,bc,dic->ad", tensor, right, tensor.conj()))
+
+        return environments
+
+    def iter_samples(self, shots: int, chunk: int = None, seed=None):
+        """
+        Stream measurement outcomes of all qubits, chunk by chunk (qubits are sampled one after the other, each
+        conditioned on the previous outcomes).
+
+        :param shots: total number of shots
+        :param chunk: number of shots per chunk, sampling.chunk_size divided by the largest bond dimension if None
+        :param seed: seed or numpy Generator
+
+        :return: generator of (shots of the chunk, n) outcome bits
+        """
+
+        rng = np.random.default_rng(seed)
+        environments = self._environments()
+        # Each shot of a chunk holds (bond dimension,) vectors
+        chunk = chunk or max(1, sampling.chunk_size // max(self.bond_dimensions(), default=1))
+
+        remaining = shots
+        while remaining > 0:
+            n = min(chunk, remaining)
+            remaining -= n
+
+            outcomes = np.zeros((n, self.size), dtype=bool)
+            # Left part of the chain contracted with the outcomes so far
+            left = np.ones((n, 1), dtype=self.dtype)
+
+            for q, tensor in enumerate(self.tensors):
+                vectors = [left @ tensor[:, bit, :] for bit in (0, 1)]
+                weights = [np.einsum("sa,ab,sb->s", v, environments[q + 1], v.conj()).real for v in vectors]
+
+                p1 = weights[1] / (weights[0] + weights[1])
+                bits = rng.random(n) < p1
+                outcomes[:, q] = bits
+
+                chosen = np.where(bits[:, None], vectors[1], vectors[0])
+                norms = np.sqrt(np.where(bits, weights[1], weights[0]))
+                left = chosen / norms[:, None]
+
+            yield outcomes
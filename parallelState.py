@@ -0,0 +1,180 @@
+import multiprocessing as mp
+import os
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from statevector import as_tensor, apply_gate, apply_controlled_gate, apply_pair, _axis, check_cancel
+from profiler import profiler
+
+
+"""
+
+Multi-process statevector, for large (25-30 qubits) circuits on a single machine.
+
+The 2^n amplitudes live in a single shared memory block (multiprocessing.shared_memory) that every worker process
+maps, nothing is ever copied between processes. The state is partitioned on its p most significant qubits (the
+partition qubits): worker w owns the contiguous segment of the 2^(n-p) amplitudes whose partition qubits are the bits
+of w, and all workers go through the gate list together, waiting for each other after every gate (barrier).
+
+- Gates on local qubits (p and beyond) only pair amplitudes within a segment: each worker applies them on its own
+  segment (statevector.py kernels), controlled gates whose control is a partition qubit only on segments where it
+  is |1>.
+- Gates whose target is a partition qubit pair amplitudes of two segments (w and its partner w ^ bit): both workers
+  of the pair process the pair of segments together, each one half of it (first local qubit at 0 or 1), so no
+  amplitude is read or written by two workers. Diagonal gates only scale each segment.
+
+With 2^p workers each doing 1/2^p of the work of every gate, throughput scales with the number of cores as long as
+gates are large enough for the barrier to be negligible (20+ qubits).
+
+"""
+
+
+def partition_qubits(size: int, processes: int) -> int:
+    """ Number of partition qubits: 2^p workers (at most processes), each segment keeping at least 2 local qubits """
+    return max(0, min(int(processes).bit_length() - 1, size - 2))
+
+
+def apply_partitioned(segments: np.ndarray, gate, index: int or list or tuple, partition: int, rank: int) -> None:
+    """
+    Apply the part of a circuit operation that falls to a worker
+
+    :param segments: (2^p, 2, ..., 2) amplitudes tensor, segment w holding the states whose partition qubits are w
+    :param gate: Gate object
+    :param index: line index for simple gates, (control, target) for complex gates
+    :param partition: number of partition qubits (p)
+    :param rank: worker number (w)
+    """
+
+    local = segments.ndim - 1
+    mat = gate.matrix(segments.dtype)
+    control, target = (None, index) if type(index) is int else index
+
+    def bit(qubit):
+        """ Value of a partition qubit in the segment of the worker """
+        return (rank >> (partition - 1 - qubit)) & 1
+
+    if control is not None and control < partition and not bit(control):
+        return
+
+    own = segments[rank]
+
+    if target >= partition:
+        # Within the segment
+        if control is None or control < partition:
+            apply_gate(own, mat, target - partition, local, gate.structure)
+        else:
+            apply_controlled_gate(own, mat, control - partition, target - partition, local, gate.structure)
+        return
+
+    b = bit(target)
+
+    if gate.structure == "diagonal":
+        if control is not None and control >= partition:
+            own = own[_axis(local, control - partition, 1)]
+        if mat[b, b] != 1:
+            own *= mat[b, b]
+        return
+
+    # Pair of segments, the worker takes half b of it
+    low = rank & ~(1 << (partition - 1 - target))
+    a0, a1 = segments[low], segments[low | 1 << (partition - 1 - target)]
+
+    if control is not None and control >= partition:
+        a0, a1 = a0[_axis(local, control - partition, 1)], a1[_axis(local, control - partition, 1)]
+
+    apply_pair(a0[b:b + 1], a1[b:b + 1], mat, gate.structure)
+
+
+def _work(name: str, size: int, dtype, partition: int, rank: int, operations: list, barrier) -> None:
+    """ Worker process: go through the gate list on the shared amplitudes """
+
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        state = np.ndarray((2 ** size,), dtype=dtype, buffer=memory.buf)
+        segments = as_tensor(state.reshape(2 ** partition, -1), size - partition)
+
+        try:
+            for gate, index in operations:
+                apply_partitioned(segments, gate, index, partition, rank)
+                barrier.wait()
+        except threading.BrokenBarrierError:
+            return
+        except BaseException:
+            # Release the other workers
+            barrier.abort()
+            raise
+
+        del state, segments
+    finally:
+        memory.close()
+
+
+def evolve(initial_state: np.ndarray or None, operations: list, size: int, processes: int = None, cancel=None,
+           dtype=np.complex128, reduce=None):
+    """
+    Evolve a state through a list of operations, on several processes.
+
+    The shared block is released before returning: results should be read from it by reduce (probabilities, a
+    measurement ..), the final amplitudes are otherwise copied out of it, which doubles the peak memory.
+
+    :param initial_state: initial amplitudes, |0...0> if None
+    :param operations: list of (gate, index, column) operations
+    :param size: number of qubits
+    :param processes: number of worker processes (rounded down to a power of two), os.cpu_count() if None
+    :param cancel: threading.Event checked while waiting for the workers, the simulation is cancelled once set
+    :param dtype: amplitudes dtype (complex64 or complex128)
+    :param reduce: function of the final (shared) amplitudes returning the result, which must not keep a view of them
+
+    :return: reduce(final amplitudes), a copy of the final amplitudes if reduce is None
+    """
+
+    partition = partition_qubits(size, processes or os.cpu_count() or 1)
+    workers = 2 ** partition
+
+    memory = shared_memory.SharedMemory(create=True, size=2 ** size * np.dtype(dtype).itemsize)
+    state = None
+    try:
+        state = np.ndarray((2 ** size,), dtype=dtype, buffer=memory.buf)
+        if initial_state is None:
+            state[:] = 0
+            state[0] = 1
+        else:
+            state[:] = initial_state
+
+        with profiler.span("contraction", gate="all", processes=workers, gates=len(operations)):
+            context = mp.get_context()
+            barrier = context.Barrier(workers)
+            gate_list = [(gate, index) for gate, index, _ in operations]
+
+            pool = [context.Process(target=_work, args=(memory.name, size, dtype, partition, rank, gate_list, barrier),
+                                    daemon=True) for rank in range(workers)]
+            for process in pool:
+                process.start()
+
+            try:
+                for process in pool:
+                    while process.is_alive():
+                        check_cancel(cancel)
+                        process.join(0.05)
+            finally:
+                for process in pool:
+                    if process.is_alive():
+                        process.terminate()
+                        process.join()
+
+            if any(process.exitcode != 0 for process in pool):
+                raise RuntimeError("A statevector worker process failed (exit codes {})"
+                                   .format([process.exitcode for process in pool]))
+
+        for gate, _, _ in operations:
+            profiler.count("gate " + (gate.name or "fused"))
+
+        return state.copy() if reduce is None else reduce(state)
+
+    finally:
+        # No view of the block may outlive it
+        state = None
+        memory.close()
+        memory.unlink()
@@ -0,0 +1,218 @@
+import numpy as np
+
+from circuit import circuit, estimate_cost
+import memmapState
+import parallelState
+import stabilizer
+from profiler import profiler
+
+
+"""
+
+Backend planner: picks the cheapest backend able to simulate a circuit within a memory budget.
+
+The gate list is summarized (see features: qubits, gates, two qubit gates, depth, Clifford or not, entanglement
+across each bond of the lines chain), the time and memory of each backend able to simulate it are estimated, and the
+fastest backend whose memory fits the budget is chosen (the least memory hungry one if none fits):
+
+    decision = planner.plan(CIRCUIT, memory_budget=2 ** 30)
+    planner.apply_plan(CIRCUIT, decision)
+    print(decision)
+
+Estimates are rough (see circuit.estimate_cost), they only need to order the backends. The task matters: all 2^n
+probabilities need a 2^n array whatever the backend, samples do not for the 'stabilizer' and 'mps' backends.
+
+"""
+
+# Tasks a circuit is planned for
+tasks = ("probabilities", "samples")
+
+
+def features(CIRCUIT: circuit) -> dict:
+    """
+    Summary of a circuit gate list
+
+    :param CIRCUIT: 'circuit' object
+    :return: {'size', 'gates', 'two_qubit_gates', 'depth', 'clifford', 'max_cut', 'distance'}, max_cut being the
+             most two qubit gates crossing a bond of the lines chain and distance the total number of lines they span
+    """
+
+    size = CIRCUIT.size
+    line_depth = [0] * size
+    cuts = np.zeros(max(size - 1, 0), dtype=np.int64)
+    two_qubit_gates, distance = 0, 0
+
+    for _, index, _ in CIRCUIT.operations:
+        qubits = (index,) if type(index) is int else tuple(index)
+
+        depth = max(line_depth[q] for q in qubits) + 1
+        for q in qubits:
+            line_depth[q] = depth
+
+        if len(qubits) == 2:
+            low, high = min(qubits), max(qubits)
+            cuts[low:high] += 1
+            two_qubit_gates += 1
+            distance += high - low
+
+    return {"size": size, "gates": len(CIRCUIT.operations), "two_qubit_gates": two_qubit_gates,
+            "depth": max(line_depth, default=0), "clifford": CIRCUIT.is_clifford(),
+            "max_cut": int(cuts.max(initial=0)), "distance": distance}
+
+
+def bond_dimension(summary: dict, max_bond: int = None) -> int:
+    """ Largest bond dimension the 'mps' backend may reach (each crossing gate at most doubles a bond), capped """
+    chi = 2 ** min(summary["max_cut"], summary["size"] // 2, 62)
+    return chi if max_bond is None else min(chi, max_bond)
+
+
+def estimate(summary: dict, backend: str, precision: str = "double", task: str = "probabilities",
+             max_bond: int = 64, storage: bool = False, processes: int = None) -> tuple:
+    """
+    Time and memory of a backend
+
+    :param summary: circuit features (see features)
+    :param backend: circuit backend
+    :param precision: 'single' or 'double' (see circuit.precisions)
+    :param task: 'probabilities' (all 2^n states) or 'samples' (see tasks)
+    :param max_bond: bond dimension cap of the 'mps' backend
+    :param storage: amplitudes kept in a file ('statevector' backend, see memmapState.py)
+    :param processes: worker processes sharing the amplitudes ('statevector' backend, see parallelState.py)
+
+    :return: (time in s, memory in bytes)
+    """
+
+    size, gates_amount = summary["size"], summary["gates"]
+    time, memory = estimate_cost(size, gates_amount, backend, precision)
+
+    if backend == "mps":
+        # Two qubit gates cost a SVD of the bond dimension reached, one per swap for distant lines
+        chi = bond_dimension(summary, max_bond)
+        itemsize = np.dtype(circuit.precisions[precision]).itemsize
+        time = (summary["two_qubit_gates"] + 2 * summary["distance"]) * (chi ** 3 * 1e-8 + 1e-4) + gates_amount * 1e-5
+        memory = 3 * size * 2 * chi ** 2 * itemsize
+
+    if backend == "statevector" and storage:
+        # Only a block of the file (and its temporaries) is in memory, the file is read and written once per gate
+        itemsize = np.dtype(circuit.precisions[precision]).itemsize
+        memory = min(memory, 3 * 2 ** min(size, memmapState.chunk_qubits) * itemsize)
+        time *= 10
+    elif backend == "statevector" and processes is not None and processes > 1:
+        # Gates split between the workers, plus their start and a barrier per gate. The shared amplitudes and the
+        # gate temporaries of the workers (one segment each), plus the real probabilities read from the shared block
+        workers = 2 ** parallelState.partition_qubits(size, processes)
+        itemsize = np.dtype(circuit.precisions[precision]).itemsize
+        time = time / workers + 0.05 + gates_amount * 1e-4
+        memory = 2 * 2 ** size * itemsize + (2 ** size * itemsize // 2 if task == "probabilities" else 0)
+
+    if task == "probabilities" and backend in ("stabilizer", "mps"):
+        # The 2^n probabilities array itself
+        time += 2 ** size * 1e-8 * (1 if backend == "stabilizer" else size)
+        memory += 3 * 8 * 2 ** size
+
+    return time, memory
+
+
+class Plan(object):
+
+    def __init__(self, backend: str, estimates: dict, summary: dict, memory_budget: int or None):
+        """
+        Backend decision of the planner
+
+        :param backend: chosen backend
+        :param estimates: {backend: (time in s, memory in bytes)} of the backends able to simulate the circuit
+        :param summary: circuit features (see features)
+        :param memory_budget: memory budget in bytes (None for no limit)
+        """
+
+        self.backend = backend
+        self.estimates = estimates
+        self.summary = summary
+        self.memory_budget = memory_budget
+
+    @property
+    def time(self) -> float:
+        return self.estimates[self.backend][0]
+
+    @property
+    def memory(self) -> int:
+        return self.estimates[self.backend][1]
+
+    @property
+    def fits(self) -> bool:
+        """ Whether the chosen backend memory fits the budget """
+        return self.memory_budget is None or self.memory <= self.memory_budget
+
+    def as_dict(self) -> dict:
+        """ Decision, estimates and features (JSON serializable, for logging) """
+        return {"backend": self.backend, "fits": self.fits, "memory_budget": self.memory_budget,
+                "estimates": {backend: {"time": time, "memory": int(memory)}
+                              for backend, (time, memory) in self.estimates.items()},
+                "features": dict(self.summary)}
+
+    def __str__(self):
+        estimates = ", ".join("{} {:.3g}s {:.3g}MiB".format(backend, time, memory / 2 ** 20)
+                              for backend, (time, memory) in sorted(self.estimates.items(), key=lambda e: e[1]))
+        return "backend '{}'{} ({})".format(self.backend, "" if self.fits else " (above the memory budget)",
+                                            estimates)
+
+
+def candidates(CIRCUIT: circuit, summary: dict, task: str = "probabilities") -> list:
+    """ Backends able to simulate the circuit (for the task) """
+
+    backends = ["statevector", "dense", "sparse"]
+
+    if CIRCUIT.initial_state is None:
+        # All probabilities are only listed for up to 2^max_outcome_bits outcomes (see stabilizer.Tableau)
+        if summary["clifford"] and (task == "samples" or
+                                    len(CIRCUIT.get_tableau().support()[1]) <= stabilizer.max_outcome_bits):
+            backends.append("stabilizer")
+        # Only exact matrix product states (no truncation) are planned
+        if bond_dimension(summary) <= CIRCUIT.max_bond:
+            backends.append("mps")
+
+    return backends
+
+
+def plan(CIRCUIT: circuit, memory_budget: int = None, task: str = "probabilities", storage: bool = False) -> Plan:
+    """
+    Choose the backend of a circuit
+
+    :param CIRCUIT: 'circuit' object (its precision and mps truncation are taken into account)
+    :param memory_budget: memory budget in bytes, no limit if None
+    :param task: 'probabilities' (all 2^n states) or 'samples' (see tasks)
+    :param storage: amplitudes kept in a file if the 'statevector' backend is chosen (see circuit.set_storage,
+                    apply_plan)
+
+    :return: Plan
+    """
+
+    if task not in tasks:
+        raise ValueError("Unknown task '{}', must be one of {}".format(task, tasks))
+
+    with profiler.span("planning", task=task) as info:
+        summary = features(CIRCUIT)
+
+        estimates = {backend: estimate(summary, backend, CIRCUIT.precision, task, CIRCUIT.max_bond, storage,
+                                       CIRCUIT.processes)
+                     for backend in candidates(CIRCUIT, summary, task)}
+
+        fitting = [backend for backend, (_, memory) in estimates.items()
+                   if memory_budget is None or memory <= memory_budget]
+
+        if fitting:
+            backend = min(fitting, key=lambda b: estimates[b][0])
+        else:
+            backend = min(estimates, key=lambda b: estimates[b][1])
+
+        decision = Plan(backend, estimates, summary, memory_budget)
+        info.update(backend=backend, fits=decision.fits)
+
+    return decision
+
+
+def apply_plan(CIRCUIT: circuit, decision: Plan) -> None:
+    """ Switch a circuit to the planned backend (file storage only stays with the 'statevector' backend) """
+    if decision.backend != "statevector":
+        CIRCUIT.set_storage(None)
+    CIRCUIT.set_backend(decision.backend)
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter_ns
+
+
+"""
+
+Instrumentation of the simulator and GUI layers.
+
+Stages are wrapped in spans (conversion, compilation, per-gate construction/contraction, probability extraction,
+plot draw ..) and gates are counted. Nothing is recorded until the profiler is enabled (profiler.enable()), it can be
+toggled at any time. Recorded events are exported as a Chrome trace JSON file (chrome://tracing, Perfetto):
+
+    from profiler import profiler
+    profiler.enable(memory=True)
+    ...
+    profiler.export("trace.json")
+
+With memory=True, tracemalloc is started and the peak allocation within each outermost span (beyond what was
+allocated when it started) is added to its args (this slows the simulation down noticeably).
+
+"""
+
+
+class Profiler(object):
+
+    def __init__(self):
+        """ Spans and counters recorder """
+
+        self.enabled = False
+        self.memory = False
+
+        self.events = []
+        self.counters = {}
+
+        self.start = perf_counter_ns()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, memory: bool = False) -> None:
+        """
+        Start recording
+
+        :param memory: also capture peak allocations (tracemalloc)
+        """
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self) -> None:
+        """ Stop recording (recorded events are kept until clear) """
+        self.enabled = False
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory = False
+
+    def clear(self) -> None:
+        with self.lock:
+            self.events = []
+            self.counters = {}
+
+    def _now(self) -> float:
+        """ Time since the profiler creation in us """
+        return (perf_counter_ns() - self.start) / 1000
+
+    @contextmanager
+    def span(self, name: str, category: str = "simulator", **args):
+        """
+        Record the duration of the wrapped code
+
+        :param name: span name
+        :param category: span category (ex: 'simulator', 'gui')
+        :param args: additional information attached to the span (can be updated within the span)
+        """
+
+        if not self.enabled:
+            yield args
+            return
+
+        depth = getattr(self.local, "depth", 0)
+        self.local.depth = depth + 1
+
+        if self.memory and depth == 0 and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self.local.allocated = tracemalloc.get_traced_memory()[0]
+
+        begin = self._now()
+        try:
+            yield args
+        finally:
+            end = self._now()
+            self.local.depth = depth
+
+            if self.memory and depth == 0 and tracemalloc.is_tracing():
+                args["peak_bytes"] = tracemalloc.get_traced_memory()[1] - getattr(self.local, "allocated", 0)
+
+            event = {"name": name, "cat": category, "ph": "X", "ts": begin, "dur": end - begin,
+                     "pid": os.getpid(), "tid": threading.get_ident(), "args": args}
+
+            with self.lock:
+                self.events.append(event)
+
+    def count(self, name: str, n: int = 1) -> None:
+        """ Increment a counter (ex: gates applied per gate name) """
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def export(self, path: str) -> None:
+        """ Write recorded spans and counters as a Chrome trace JSON file """
+
+        with self.lock:
+            events = list(self.events)
+            if self.counters:
+                events.append({"name": "counters", "ph": "C", "ts": self._now(), "pid": os.getpid(),
+                               "args": dict(self.counters)})
+
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+# Profiler shared by all layers
+profiler = Profiler()
@@ -0,0 +1,344 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from circuit import circuit, estimate_cost, top_states, check_precision
+from compiler import compile_circuit
+from gates import gates
+from profiler import profiler
+import circuitFile
+import planner
+
+
+"""
+
+Headless entry point of the simulator (library and command line), importing neither tkinter nor matplotlib.
+
+A circuit is described by its size and a list of gate records (name, column, target, control), control being None
+for 'simple' gates, which is the model built by circuit_frame.convert_to_simulator. See circuitFile.py for the file
+formats (.json for a single circuit, .jsonl and packed binary .qcb for many circuits).
+
+Command line usage:
+
+    python qcs.py circuit.json                                  # probabilities of all non-zero states
+    python qcs.py circuit.json --shots 1000                     # sampled counts
+    python qcs.py - < circuit.json                              # circuit read from stdin
+    python qcs.py circuit.json --top 10                         # 10 most probable states only
+    python qcs.py big.json --memmap /scratch --top 10           # amplitudes kept in a file (larger than memory)
+    python qcs.py big.json --processes 16 --top 10              # gates applied by 16 processes (shared memory)
+    python qcs.py wide.json --backend mps --shots 1000          # matrix product state (wide, shallow circuits)
+    python qcs.py circuit.json --explain                        # backend chosen per circuit (see planner.py)
+    python qcs.py circuits.qcb --format jsonl -o results.jsonl  # stream a multi-circuit file
+    python qcs.py circuit.json --trace trace.json               # Chrome trace of the run (see profiler.py)
+
+Multi-circuit files are streamed: circuits are read, simulated and their results written one at a time.
+
+"""
+
+
+def build_circuit(size: int, records: list or tuple, backend: str = "statevector",
+                  initial_state: np.ndarray = None, storage: str = None, precision: str = "double",
+                  truncation: tuple = None) -> circuit:
+    """
+    Build a 'circuit' object from gate records.
+
+    :param size: circuit size (qubits amount)
+    :param records: list of (gate name, column, target line, control line or None)
+    :param backend: circuit backend (see circuit.backends)
+    :param initial_state: initial amplitudes, |0...0> if None
+    :param storage: amplitudes file (see circuit.set_storage), amplitudes are kept in memory if None
+    :param precision: 'single' or 'double' (see circuit.precisions)
+    :param truncation: (max bond, cutoff) of the 'mps' backend (see circuit.set_truncation), defaults if None
+
+    :return: 'circuit' object
+    """
+
+    CIRCUIT = circuit(size, backend=backend)
+    CIRCUIT.set_storage(storage)
+    CIRCUIT.set_precision(precision)
+    if truncation is not None:
+        CIRCUIT.set_truncation(*truncation)
+
+    CIRCUIT.set_initial_state(initial_state)
+
+    def order(record):
+        """ Same order as convert_to_simulator: column by column, from top to bottom """
+        _, column, target, control = record
+        return column, target if control is None else min(target, control)
+
+    for name, column, target, control in sorted(records, key=order):
+        if control is None:
+            CIRCUIT.add_gate(gates[name], target, column)
+        else:
+            CIRCUIT.add_gate(gates[name], (control, target), column)
+
+    return CIRCUIT
+
+
+def load_circuit(path: str, backend: str = "statevector") -> circuit:
+    """ Load a circuit from a file (first circuit of multi-circuit files) """
+    return build_circuit(*circuitFile.load(path), backend=backend)
+
+
+def iter_circuits(path: str, backend: str = "statevector", storage: str = None, precision: str = "double",
+                  truncation: tuple = None):
+    """ Stream the circuits of a file ('-' for a JSON circuit from stdin) as 'circuit' objects """
+
+    if path == "-":
+        yield build_circuit(*circuitFile.from_dict(json.load(sys.stdin)), backend=backend, storage=storage,
+                            precision=precision, truncation=truncation)
+        return
+
+    for size, records in circuitFile.iter_circuits(path):
+        yield build_circuit(size, records, backend=backend, storage=storage, precision=precision,
+                            truncation=truncation)
+
+
+def simulate(CIRCUIT: circuit, measurement_states: list or tuple = None, optimize: bool = True,
+             percentage: bool = False) -> np.ndarray:
+    """
+    Probabilities of a circuit
+
+    :param CIRCUIT: 'circuit' object
+    :param measurement_states: list of measurement states bitstrings, all 2^n states (binary order) if None
+    :param optimize: apply compilation passes first (see compiler.py)
+    :param percentage: should the results be in percentage or not
+
+    :return: probabilities
+    """
+
+    if optimize:
+        CIRCUIT, _ = compile_circuit(CIRCUIT)
+
+    return CIRCUIT.get_probabilities(measurement_states, percentage=percentage)
+
+
+def bitstring(index: int, size: int) -> str:
+    """ Measurement state bitstring of the given state index """
+    return format(index, "0{}b".format(size))
+
+
+""" ##### ##### ##### ##### ##### ##### """
+
+
+def _iter_results(CIRCUIT: circuit, shots: int, rng, top: int = None, all_states: bool = False):
+    """
+    States to output, values being read chunk by chunk with file storage (see circuit.set_storage)
+
+    :return: generator of (state index, probability or count)
+    """
+
+    if CIRCUIT.backend == "mps" and shots and not all_states:
+        # Samples drawn from the matrix product state, no 2^n array
+        results = sorted(CIRCUIT.get_sparse_counts(shots, seed=rng).items())
+        if top:
+            results = sorted(results, key=lambda result: (-result[1], result[0]))[:top]
+
+        yield from results
+        return
+
+    if not all_states and CIRCUIT.uses_stabilizer(all_outcomes=not shots):
+        # Clifford circuit: no 2^n array, only the possible (or sampled) outcomes
+        if shots:
+            results = sorted(CIRCUIT.get_sparse_counts(shots, seed=rng).items())
+        else:
+            tableau = CIRCUIT.get_tableau()
+            probability = np.float64(2. ** -len(tableau.support()[1]))
+            results = [(i, probability) for i in np.sort(tableau.outcome_indices())]
+
+        if top:
+            results = sorted(results, key=lambda result: (-result[1], result[0]))[:top]
+
+        yield from results
+        return
+
+    if CIRCUIT.storage is None:
+        chunks = [(0, CIRCUIT.get_counts(shots, seed=rng) if shots else CIRCUIT.get_probabilities())]
+    elif shots:
+        chunks = CIRCUIT.iter_state_counts(shots, seed=rng)
+    else:
+        chunks = CIRCUIT.iter_probabilities()
+
+    if top:
+        # Top states of each chunk, merged with the best ones so far
+        indices, values = np.empty(0, dtype=np.int64), None
+
+        for start, chunk in chunks:
+            best = top_states(chunk, top)
+            indices = np.concatenate((indices, best + start))
+            values = chunk[best] if values is None else np.concatenate((values, chunk[best]))
+
+            best = top_states(values, top)
+            indices, values = indices[best], values[best]
+
+        if values is None:
+            return
+
+        order = np.lexsort((indices, -values))
+        yield from zip(indices[order], values[order])
+        return
+
+    for start, chunk in chunks:
+        for i in range(len(chunk)) if all_states else np.flatnonzero(chunk > 1e-12):
+            yield start + i, chunk[i]
+
+
+def run(path: str, output, backend: str = "auto", shots: int = 0, seed=None, optimize: bool = True,
+        output_format: str = "text", all_states: bool = False, max_memory: int = None,
+        top: int = None, storage: str = None, precision: str = "double", check: bool = False,
+        truncation: tuple = None, explain: bool = False, processes: int = None,
+        stabilizer_dispatch: bool = True) -> int:
+    """
+    Simulate all circuits of a file, writing results as soon as each circuit is done (bounded memory).
+
+    :param path: circuit file ('-' for a JSON circuit from stdin)
+    :param output: writable text file
+    :param backend: circuit backend, 'auto' to let the planner choose it for each circuit (see planner.py)
+    :param shots: sample counts instead of exact probabilities if non-zero
+    :param seed: sampling seed
+    :param optimize: apply compilation passes first (see compiler.py)
+    :param output_format: 'text' ("bitstring value" lines) or 'jsonl' (one JSON object per circuit)
+    :param all_states: also write zero probability states
+    :param top: only write the top most probable (or sampled) states, by decreasing value
+    :param max_memory: refuse circuits whose estimated memory (bytes, see circuit.estimate_cost) is above it, memory
+                       budget of the planner with the 'auto' backend
+    :param storage: directory of a temporary amplitudes file, for circuits larger than the memory
+                    ('statevector' backend, see memmapState.py), amplitudes are kept in memory if None
+    :param precision: 'single' or 'double' (see circuit.precisions)
+    :param check: compare each circuit against double precision (see circuit.check_precision), raising an
+                  ArithmeticError if the error is above its bound
+    :param truncation: (max bond, cutoff) of the 'mps' backend (see circuit.set_truncation), defaults if None
+    :param explain: write the planner decision of each circuit to stderr ('auto' backend)
+    :param processes: worker processes sharing the amplitudes ('statevector' backend in memory, see parallelState.py)
+    :param stabilizer_dispatch: simulate Clifford circuits on a stabilizer tableau ('statevector' backend, see
+                                circuit.uses_stabilizer)
+
+    :return: number of circuits simulated
+    """
+
+    rng = np.random.default_rng(seed)
+    multi = path != "-" and circuitFile.file_format(path) != "json"
+
+    storage_file = None
+    if storage is not None:
+        handle, storage_file = tempfile.mkstemp(suffix=".amplitudes", dir=storage)
+        os.close(handle)
+
+    n = 0
+    try:
+        circuits = iter_circuits(path, "statevector" if backend == "auto" else backend, storage_file, precision,
+                                 truncation)
+
+        for n, CIRCUIT in enumerate(circuits, 1):
+            CIRCUIT.set_processes(processes)
+            CIRCUIT.stabilizer_dispatch = stabilizer_dispatch
+
+            if backend == "auto":
+                decision = planner.plan(CIRCUIT, max_memory, "samples" if shots and not all_states else "probabilities",
+                                        storage_file is not None)
+                planner.apply_plan(CIRCUIT, decision)
+                if explain:
+                    sys.stderr.write("circuit {}: {}\n".format(n - 1, decision))
+
+            if max_memory is not None and CIRCUIT.storage is None:
+                if backend == "auto":
+                    memory = decision.memory
+                else:
+                    _, memory = estimate_cost(CIRCUIT.size, len(CIRCUIT.operations), backend, precision)
+                if memory > max_memory:
+                    raise MemoryError("circuit {} ({} qubits) needs about {:.0f}MiB, above the {:.0f}MiB limit"
+                                      .format(n - 1, CIRCUIT.size, memory / 2 ** 20, max_memory / 2 ** 20))
+
+            if optimize:
+                CIRCUIT, _ = compile_circuit(CIRCUIT)
+
+            if check:
+                error, bound = check_precision(CIRCUIT, precision)
+                if error > bound:
+                    raise ArithmeticError("circuit {}: {} precision error {:.3g} above its bound {:.3g}"
+                                          .format(n - 1, precision, error, bound))
+
+            results = _iter_results(CIRCUIT, shots, rng, top, all_states)
+
+            if output_format == "jsonl":
+                result = {bitstring(i, CIRCUIT.size): value.item() for i, value in results}
+                record = {"circuit": n - 1, "counts" if shots else "probabilities": result}
+                if CIRCUIT.backend == "mps":
+                    record["truncation_error"] = CIRCUIT.get_truncation_error()
+                output.write(json.dumps(record) + "\n")
+            else:
+                if multi:
+                    output.write("# circuit {}\n".format(n - 1))
+                if CIRCUIT.backend == "mps":
+                    output.write("# truncation error {:.3g}\n".format(CIRCUIT.get_truncation_error()))
+                for i, value in results:
+                    output.write("{} {}\n".format(bitstring(i, CIRCUIT.size), value))
+
+            output.flush()
+
+    finally:
+        if storage_file is not None:
+            os.remove(storage_file)
+
+    return n
+
+
+def main(argv: list = None) -> None:
+
+    parser = argparse.ArgumentParser(prog="qcs", description="Headless quantum circuit simulator")
+    parser.add_argument("circuit", help="circuit file, .json/.jsonl/.qcb ('-' for a JSON circuit from stdin)")
+    parser.add_argument("--backend", default="auto", choices=circuit.backends + ("auto",),
+                        help="'auto' (default) picks the cheapest backend per circuit (see planner.py)")
+    parser.add_argument("--explain", action="store_true", help="write the backend decisions to stderr")
+    parser.add_argument("--shots", type=int, default=0, help="sample counts instead of exact probabilities")
+    parser.add_argument("--seed", type=int, default=None, help="sampling seed")
+    parser.add_argument("--all", action="store_true", help="also print zero probability states")
+    parser.add_argument("--top", type=int, default=None, help="only print the k most probable states")
+    parser.add_argument("--no-optimize", action="store_true", help="skip compilation passes")
+    parser.add_argument("--format", default="text", choices=("text", "jsonl"), help="output format")
+    parser.add_argument("-o", "--output", default=None, help="output file (stdout by default)")
+    parser.add_argument("--precision", default="double", choices=tuple(circuit.precisions),
+                        help="complex64 (single) or complex128 (double) amplitudes")
+    parser.add_argument("--check-precision", action="store_true",
+                        help="fail if a circuit deviates from double precision beyond the rounding error bound")
+    parser.add_argument("--max-bond", type=int, default=64, help="bond dimension cap of the mps backend")
+    parser.add_argument("--cutoff", type=float, default=1e-12,
+                        help="singular values weight cutoff of the mps backend")
+    parser.add_argument("--memmap", default=None, metavar="DIR",
+                        help="keep the amplitudes in a temporary file of DIR (circuits larger than the memory)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes sharing the amplitudes (statevector backend)")
+    parser.add_argument("--no-stabilizer", action="store_true",
+                        help="simulate Clifford circuits on the amplitudes too (no stabilizer tableau)")
+    parser.add_argument("--max-memory", type=int, default=None, help="refuse circuits estimated above this (MiB)")
+    parser.add_argument("--trace", default=None, help="write a Chrome trace JSON file of the run")
+    parser.add_argument("--trace-memory", action="store_true", help="capture peak allocations in the trace")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        profiler.enable(memory=args.trace_memory)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+
+    try:
+        run(args.circuit, output, backend=args.backend, shots=args.shots, seed=args.seed,
+            optimize=not args.no_optimize, output_format=args.format, all_states=args.all,
+            max_memory=args.max_memory * 2 ** 20 if args.max_memory else None, top=args.top,
+            storage=args.memmap, precision=args.precision, check=args.check_precision,
+            truncation=(args.max_bond, args.cutoff), explain=args.explain, processes=args.processes,
+            stabilizer_dispatch=not args.no_stabilizer)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+        if args.trace:
+            profiler.disable()
+            profiler.export(args.trace)
+
+
+if __name__ == "__main__":
+    main()
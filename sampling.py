@@ -0,0 +1,84 @@
+import numpy as np
+
+
+"""
+
+Shot based sampling of a probability distribution (hardware style output).
+
+Shots are drawn chunk by chunk, each chunk being vectorized (a single multinomial draw for its counts), so that
+millions of shots never build any python list and results can be consumed while they stream in.
+
+"""
+
+# Default number of shots per chunk
+chunk_size = 2 ** 20
+
+
+def _normalize(probabilities: np.ndarray) -> np.ndarray:
+    """ Clean a probability vector from floating point errors (negative values, sum slightly off 1) """
+    probabilities = np.clip(np.asarray(probabilities, dtype=np.float64), 0, None)
+    return probabilities / probabilities.sum()
+
+
+def iter_counts(probabilities: np.ndarray, shots: int, chunk: int = None, seed=None):
+    """
+    Stream counts per outcome, chunk by chunk.
+
+    :param probabilities: probability of each outcome (2^n states in binary order for a circuit)
+    :param shots: total number of shots
+    :param chunk: number of shots per chunk
+    :param seed: seed or numpy Generator
+
+    :return: generator of counts arrays (one count per outcome) of each chunk
+    """
+
+    rng = np.random.default_rng(seed)
+    probabilities = _normalize(probabilities)
+    chunk = chunk or chunk_size
+
+    remaining = shots
+    while remaining > 0:
+        n = min(chunk, remaining)
+        remaining -= n
+        yield rng.multinomial(n, probabilities)
+
+
+def sample_counts(probabilities: np.ndarray, shots: int, chunk: int = None, seed=None) -> np.ndarray:
+    """
+    Counts per outcome for the given number of shots (see iter_counts)
+
+    :return: counts array (one count per outcome)
+    """
+
+    counts = np.zeros(len(probabilities), dtype=np.int64)
+
+    for chunk_counts in iter_counts(probabilities, shots, chunk, seed):
+        counts += chunk_counts
+
+    return counts
+
+
+def iter_chunk_counts(probability_chunks, shots: int, seed=None):
+    """
+    Counts per outcome of a distribution read chunk by chunk (never held in memory at once).
+    Shots are first split between chunks according to their total probability, then within each chunk, which is
+    exactly a multinomial draw over all outcomes.
+
+    :param probability_chunks: function returning a new iterator of (index of the first outcome, probabilities)
+                               chunks (called twice)
+    :param shots: total number of shots
+    :param seed: seed or numpy Generator
+
+    :return: generator of (index of the first outcome, counts) chunks
+    """
+
+    rng = np.random.default_rng(seed)
+
+    totals = np.array([np.sum(probabilities) for _, probabilities in probability_chunks()])
+    chunk_shots = rng.multinomial(shots, _normalize(totals))
+
+    for (start, probabilities), n in zip(probability_chunks(), chunk_shots):
+        if n:
+            yield start, rng.multinomial(n, _normalize(probabilities))
+        else:
+            yield start, np.zeros(len(probabilities), dtype=np.int64)
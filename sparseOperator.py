@@ -0,0 +1,147 @@
+import numpy as np
+
+
+"""
+
+Sparse gate operators (used instead of full 2^n x 2^n matrices by the 'sparse' backend, see circuit.py).
+
+A gate acting on k lines (k = 1 or 2) only couples basis states differing on those lines: row i of its operator has
+non-zero elements at most in the columns i XOR d, d being a combination of the bits of its lines. The operator is
+stored as one (2^n,) array of values per such d (a "diagonal" of the XOR pattern, ELL like format), those that are
+zero everywhere (ex: d flipping the control line of a controlled gate) being dropped:
+
+    G[i, i ^ d] = values[d][i]
+
+Column indices are never stored (they are i ^ d), memory is O(2^n) per gate instead of O(4^n): 2 values per row for
+simple and controlled gates, 1 for diagonal ones (Z, S, CZ ..). Products with vectors, or with matrices of column
+vectors, cost O(2^n) per gate. Operators keep the dense matrix semantics through the @ operator:
+
+    G @ state         # G.dot(state)
+    bra @ G           # G.rdot(bra)
+    G.toarray()       # full 2^n x 2^n matrix
+
+Column operators (products of the gates of a column) are kept as a product of their factors (SparseProduct), a
+product of k gates having up to 2^k values per row once multiplied out.
+
+"""
+
+
+class SparseBase(object):
+
+    # ndarray @ operator defers to operator.__rmatmul__
+    __array_ufunc__ = None
+
+    def __matmul__(self, other):
+        return self.dot(other)
+
+    def __rmatmul__(self, other):
+        return self.rdot(other)
+
+    @property
+    def shape(self) -> tuple:
+        return 2 ** self.size, 2 ** self.size
+
+
+class SparseOperator(SparseBase):
+
+    def __init__(self, size: int, qubits: tuple, local: np.ndarray, dtype=np.complex128):
+        """
+        Operator of a gate on a n qubits circuit
+
+        :param size: number of qubits (n)
+        :param qubits: lines the gate acts on, in increasing order
+        :param local: 2^k x 2^k matrix of the gate on those lines (first line being the most significant)
+        :param dtype: values dtype (complex64 or complex128)
+        """
+
+        self.size = size
+        self.dtype = np.dtype(dtype)
+
+        rows = np.arange(2 ** size)
+        masks = [1 << (size - 1 - q) for q in qubits]
+
+        # Index of each row within the local matrix
+        local_rows = np.zeros(2 ** size, dtype=np.int64)
+        for mask in masks:
+            local_rows = (local_rows << 1) | ((rows & mask) != 0)
+
+        # Pattern d (as a mask of the state indices) -> (2^n,) values
+        self.values = {}
+        for d in range(2 ** len(qubits)):
+            local_values = local[np.arange(2 ** len(qubits)), np.arange(2 ** len(qubits)) ^ d]
+            if not local_values.any():
+                continue
+
+            delta = sum(mask for j, mask in enumerate(masks) if d >> (len(masks) - 1 - j) & 1)
+            self.values[delta] = local_values[local_rows].astype(self.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.values.values())
+
+    def dot(self, x: np.ndarray) -> np.ndarray:
+        """ G x, for a (2^n,) vector or a (2^n, m) matrix """
+
+        rows = np.arange(2 ** self.size)
+        result = np.zeros(np.shape(x), dtype=np.result_type(x, self.dtype))
+
+        for delta, values in self.values.items():
+            result += (values if np.ndim(x) == 1 else values[:, None]) * x[rows ^ delta]
+
+        return result
+
+    def rdot(self, x: np.ndarray) -> np.ndarray:
+        """ x G, for a (2^n,) vector or a (m, 2^n) matrix """
+
+        rows = np.arange(2 ** self.size)
+        result = np.zeros(np.shape(x), dtype=np.result_type(x, self.dtype))
+
+        # (x G)[c] = sum_d x[c ^ d] G[c ^ d, c]
+        for delta, values in self.values.items():
+            result += (x * values)[..., rows ^ delta]
+
+        return result
+
+    def toarray(self) -> np.ndarray:
+        """ Full 2^n x 2^n matrix """
+
+        rows = np.arange(2 ** self.size)
+        result = np.zeros(self.shape, dtype=self.dtype)
+
+        for delta, values in self.values.items():
+            result[rows, rows ^ delta] = values
+
+        return result
+
+
+class SparseProduct(SparseBase):
+
+    def __init__(self, size: int, factors: list, dtype=np.complex128):
+        """
+        Product of sparse operators, kept as its factors
+
+        :param size: number of qubits
+        :param factors: list of SparseOperator, in order of application (the first one is the rightmost)
+        :param dtype: values dtype
+        """
+
+        self.size = size
+        self.factors = factors
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(factor.nbytes for factor in self.factors)
+
+    def dot(self, x: np.ndarray) -> np.ndarray:
+        for factor in self.factors:
+            x = factor.dot(x)
+        return x
+
+    def rdot(self, x: np.ndarray) -> np.ndarray:
+        for factor in reversed(self.factors):
+            x = factor.rdot(x)
+        return x
+
+    def toarray(self) -> np.ndarray:
+        return self.dot(np.eye(2 ** self.size, dtype=self.dtype))
@@ -0,0 +1,278 @@
+import numpy as np
+
+import sampling
+
+
+"""
+
+Stabilizer tableau simulation of Clifford circuits (Aaronson & Gottesman, CHP).
+
+A n qubits stabilizer state is described by n commuting Pauli operators (its stabilizer generators), each stored as
+x and z bits per qubit and a sign bit, instead of 2^n amplitudes. Clifford gates (X, Y, Z, S, H, sqrt, CX, CY, CZ)
+map Pauli operators to Pauli operators, so every gate is a few O(n) bit operations on the tableau columns.
+
+Measuring all qubits of a stabilizer state gives a uniform distribution over an affine subspace v0 + span(basis) of
+{0, 1}^n: the generators are row reduced on their x bits, the generators left without x bits are Z products whose
+signs give linear constraints on the outcomes (see Tableau.support). Probabilities of single bitstrings and samples
+then cost a few matrix products over GF(2), whatever the number of qubits.
+
+Qubit j is the line j of the circuit (first char of the bitstrings, most significant bit of the state indices).
+
+"""
+
+clifford_gates = ("I", "X", "Y", "Z", "S", "H", "sqrt", "CX", "CY", "CZ")
+
+# Most random outcome bits whose outcome indices are listed (see Tableau.outcome_indices), use sampling beyond
+max_outcome_bits = 24
+
+
+def is_clifford(operations: list) -> bool:
+    """ Whether all (gate, index, column) operations are Clifford gates (fused/unnamed gates are not) """
+    return all(gate.name in clifford_gates for gate, _, _ in operations)
+
+
+def _g(x1: np.ndarray, z1: np.ndarray, x2: np.ndarray, z2: np.ndarray) -> np.ndarray:
+    """ Power of i picked up when multiplying the Pauli (x1, z1) by (x2, z2), per qubit """
+    x1, z1, x2, z2 = (a.astype(np.int8) for a in (x1, z1, x2, z2))
+    return np.where(x1 & z1, z2 - x2, 0) + np.where(x1 & (1 - z1), z2 * (2 * x2 - 1), 0) + \
+        np.where((1 - x1) & z1, x2 * (1 - 2 * z2), 0)
+
+
+def to_indices(bits: np.ndarray) -> list:
+    """ State indices (python ints, any number of qubits) of (m, n) outcome bits """
+    packed = np.packbits(bits, axis=1)
+    shift = packed.shape[1] * 8 - bits.shape[1]
+    return [int.from_bytes(row.tobytes(), "big") >> shift for row in packed]
+
+
+def count_indices(bits: np.ndarray) -> tuple:
+    """
+    Distinct outcomes of (m, n) outcome bits and their counts, outcomes being packed (n / 8 bytes each) before
+    being compared
+
+    :return: (state indices (python ints), counts)
+    """
+    packed = np.ascontiguousarray(np.packbits(bits, axis=1))
+    rows, counts = np.unique(packed.view(np.dtype((np.void, packed.shape[1]))).ravel(), return_counts=True)
+
+    shift = packed.shape[1] * 8 - bits.shape[1]
+    return [int.from_bytes(row.tobytes(), "big") >> shift for row in rows], counts
+
+
+class Tableau(object):
+
+    def __init__(self, size: int):
+        """
+        Stabilizer tableau of the |0...0> state (generators Z_0 .. Z_n-1)
+
+        :param size: number of qubits
+        """
+
+        self.size = size
+
+        # Generator i, qubit j
+        self.x = np.zeros((size, size), dtype=bool)
+        self.z = np.eye(size, dtype=bool)
+        # Sign bits (-1)^r
+        self.r = np.zeros(size, dtype=bool)
+
+        # (v0, basis, constraints) of the measurement outcomes, see support
+        self._support = None
+
+    """ ##### ##### ##### ##### ##### ##### """
+
+    def h(self, q: int) -> None:
+        self.r ^= self.x[:, q] & self.z[:, q]
+        self.x[:, q], self.z[:, q] = self.z[:, q].copy(), self.x[:, q].copy()
+
+    def s(self, q: int) -> None:
+        self.r ^= self.x[:, q] & self.z[:, q]
+        self.z[:, q] ^= self.x[:, q]
+
+    def cx(self, control: int, target: int) -> None:
+        self.r ^= self.x[:, control] & self.z[:, target] & ~(self.x[:, target] ^ self.z[:, control])
+        self.x[:, target] ^= self.x[:, control]
+        self.z[:, control] ^= self.z[:, target]
+
+    def apply(self, name: str, index: int or list or tuple) -> None:
+        """
+        Apply a Clifford gate (see clifford_gates)
+
+        :param name: gate name
+        :param index: line index for simple gates, (control, target) for complex gates
+        """
+
+        self._support = None
+
+        if name == "I":
+            pass
+        elif name == "X":
+            self.r ^= self.z[:, index]
+        elif name == "Z":
+            self.r ^= self.x[:, index]
+        elif name == "Y":
+            self.r ^= self.x[:, index] ^ self.z[:, index]
+        elif name == "S":
+            self.s(index)
+        elif name == "H":
+            self.h(index)
+        elif name == "sqrt":
+            # sqrt(X) = H S H
+            self.h(index)
+            self.s(index)
+            self.h(index)
+        elif name == "CX":
+            self.cx(*index)
+        elif name == "CZ":
+            control, target = index
+            self.h(target)
+            self.cx(control, target)
+            self.h(target)
+        elif name == "CY":
+            # CY = S CX S^-1 (S^-1 = S^3) on the target
+            control, target = index
+            for _ in range(3):
+                self.s(target)
+            self.cx(control, target)
+            self.s(target)
+        else:
+            raise ValueError("'{}' is not a Clifford gate".format(name))
+
+    """ ##### ##### ##### ##### ##### ##### """
+
+    def _multiply(self, rows: np.ndarray, pivot: int) -> None:
+        """ Multiply the given generators by the pivot generator (CHP rowsum), signs included """
+
+        phases = 2 * self.r[rows].astype(np.int64) + 2 * int(self.r[pivot]) + \
+            _g(self.x[pivot], self.z[pivot], self.x[rows], self.z[rows]).sum(axis=1)
+
+        self.r[rows] = (phases % 4) == 2
+        self.x[rows] ^= self.x[pivot]
+        self.z[rows] ^= self.z[pivot]
+
+    def support(self) -> tuple:
+        """
+        Measurement outcomes of all qubits: uniform over the affine subspace v0 + span(basis)
+
+        :return: (v0 (n,) bits, basis (k, n) bits, (constraints (m, n) bits, signs (m,) bits)), outcomes b being
+                 exactly the solutions of constraints . b = signs (mod 2), with probability 2^-k each
+        """
+
+        if self._support is not None:
+            return self._support
+
+        # Row reduction on the x bits (the generators still generate the same group)
+        row = 0
+        for column in range(self.size):
+            candidates = np.flatnonzero(self.x[row:, column]) + row
+            if not len(candidates):
+                continue
+
+            pivot = candidates[0]
+            for a in (self.x, self.z, self.r):
+                a[[row, pivot]] = a[[pivot, row]]
+
+            others = np.flatnonzero(self.x[:, column])
+            self._multiply(others[others != row], row)
+            row += 1
+
+        # Generators without x bits: (-1)^r Z^c, i.e. outcomes b verify c . b = r
+        constraints, signs = self.z[row:].copy(), self.r[row:].copy()
+
+        # Reduced row echelon form of the constraints (Z products commute, no phases involved)
+        m, pivots = len(constraints), []
+        for column in range(self.size):
+            i = len(pivots)
+            candidates = np.flatnonzero(constraints[i:, column]) + i
+            if i == m or not len(candidates):
+                continue
+
+            pivot = candidates[0]
+            constraints[[i, pivot]] = constraints[[pivot, i]]
+            signs[[i, pivot]] = signs[[pivot, i]]
+
+            others = np.flatnonzero(constraints[:, column])
+            others = others[others != i]
+            constraints[others] ^= constraints[i]
+            signs[others] ^= signs[i]
+            pivots.append(column)
+
+        free = [column for column in range(self.size) if column not in pivots]
+
+        # Free bits at 0, pivot bits given by the signs
+        v0 = np.zeros(self.size, dtype=bool)
+        v0[pivots] = signs
+
+        # One basis vector per free bit
+        basis = np.zeros((len(free), self.size), dtype=bool)
+        for k, column in enumerate(free):
+            basis[k, column] = True
+            basis[k, pivots] = constraints[:, column]
+
+        self._support = v0, basis, (constraints, signs)
+        return self._support
+
+    def probability(self, bitstring: str) -> float:
+        """ Probability of a measurement outcome ('0'/'1' chars, first char being line 0) """
+
+        _, basis, (constraints, signs) = self.support()
+        bits = np.array([char == "1" for char in bitstring])
+
+        if np.array_equal((constraints.astype(np.int64) @ bits) % 2 == 1, signs):
+            return 2. ** -len(basis)
+        return 0.
+
+    def outcome_indices(self) -> np.ndarray:
+        """
+        State indices of all possible measurement outcomes (unsorted), see support. Built by doubling: the indices
+        of v0 + span(basis[:i + 1]) are those of v0 + span(basis[:i]) and the same XOR the index of basis[i], which
+        never needs the (2^k, n) outcome bits.
+
+        :return: (2^k,) indices, int64 up to 62 qubits, python ints (object array) beyond
+        """
+
+        v0, basis, _ = self.support()
+
+        if len(basis) > max_outcome_bits:
+            raise ValueError("2^{} equally likely outcomes, too many to list (sample them instead)".format(len(basis)))
+
+        dtype = np.int64 if self.size <= 62 else object
+        indices = np.array(to_indices(v0[None]), dtype=dtype)
+
+        for vector in to_indices(basis):
+            indices = np.concatenate((indices, indices ^ np.array(vector, dtype=dtype)))
+
+        return indices
+
+    def probabilities(self) -> np.ndarray:
+        """ Probabilities of all 2^n states in binary order """
+
+        probabilities = np.zeros(2 ** self.size)
+        probabilities[self.outcome_indices()] = 2. ** -len(self.support()[1])
+        return probabilities
+
+    def iter_samples(self, shots: int, chunk: int = None, seed=None):
+        """
+        Stream measurement outcomes of all qubits, chunk by chunk.
+
+        :param shots: total number of shots
+        :param chunk: number of shots per chunk, sampling.chunk_size bits per chunk (chunk_size / n shots) if None
+        :param seed: seed or numpy Generator
+
+        :return: generator of (shots of the chunk, n) outcome bits
+        """
+
+        rng = np.random.default_rng(seed)
+        v0, basis, _ = self.support()
+        chunk = chunk or max(1, sampling.chunk_size // max(self.size, len(basis), 1))
+
+        # Sums of at most n bits are exact in float32, whose products go through BLAS
+        basis = basis.astype(np.float32)
+
+        remaining = shots
+        while remaining > 0:
+            n = min(chunk, remaining)
+            remaining -= n
+
+            bits = rng.integers(0, 2, size=(n, len(basis)), dtype=np.uint8).astype(np.float32)
+            yield v0 ^ (np.fmod(bits @ basis, 2) == 1)
@@ -0,0 +1,188 @@
+import numpy as np
+
+from profiler import profiler
+
+
+"""
+
+Statevector kernels.
+
+The state of a n qubits circuit is kept as a single array of 2^n amplitudes. Instead of expanding every gate into
+a 2^n x 2^n matrix (kron with identities), the amplitudes are viewed as a (2,)*n tensor, qubit 0 being the first
+axis (same ordering as the kron products of circuit.add_gate), and only the axes of the target/control qubits are
+touched. Work per gate is thus O(2^n) instead of O(4^n) memory and O(8^n) work.
+
+Qubit axes are always counted from the end of the tensor, so any leading axes are left untouched.
+
+Amplitudes are complex64 or complex128 (see circuit.precisions), gate matrices are used in the same dtype so that
+single precision states never go through double precision temporaries.
+
+Gates are applied according to their structure (see gates.get_structure): diagonal gates (Z, S, CZ ..) as in place
+phase multiplications, permutation gates (X, Y, CX ..) as swaps of the two halves of the qubit axis (with phases),
+and only the other gates (H ..) through the general 2x2 combination.
+
+"""
+
+
+class SimulationCancelled(Exception):
+    """ Raised when a simulation is cancelled (see worker.SimulationWorker) """
+
+
+def as_tensor(state: np.ndarray, size: int) -> np.ndarray:
+    """ View of a (..., 2^n) amplitude array as a (..., 2, 2, ..., 2) tensor (no copy) """
+    return state.reshape(state.shape[:-1] + (2,) * size)
+
+
+def _axis(size: int, qubit: int, bit: int) -> tuple:
+    """ Index selecting the given bit value of the given qubit axis """
+    index = [slice(None)] * size
+    index[qubit] = bit
+    return (Ellipsis, *index)
+
+
+""" ##### ##### ##### ##### ##### ##### """
+
+
+def _apply_diagonal(a0: np.ndarray, a1: np.ndarray, mat: np.ndarray) -> None:
+    """ Diagonal gate: phase multiplications (identity phases are skipped) """
+    if mat[0, 0] != 1:
+        a0 *= mat[0, 0]
+    if mat[1, 1] != 1:
+        a1 *= mat[1, 1]
+
+
+def _apply_permutation(a0: np.ndarray, a1: np.ndarray, mat: np.ndarray) -> None:
+    """ Anti-diagonal gate: swap of both halves, with phases """
+    temp = a0.copy()
+
+    if mat[0, 1] != 1:
+        np.multiply(a1, mat[0, 1], out=a0)
+    else:
+        a0[...] = a1
+
+    if mat[1, 0] != 1:
+        np.multiply(temp, mat[1, 0], out=a1)
+    else:
+        a1[...] = temp
+
+
+def _apply_dense(a0: np.ndarray, a1: np.ndarray, mat: np.ndarray) -> None:
+    """ General 2x2 gate """
+    new_0 = mat[0, 0] * a0 + mat[0, 1] * a1
+    a1[...] = mat[1, 0] * a0 + mat[1, 1] * a1
+    a0[...] = new_0
+
+
+def apply_pair(a0: np.ndarray, a1: np.ndarray, mat: np.ndarray, structure: str = "dense") -> None:
+    """
+    Apply a 2x2 gate in place on amplitudes pairs (a0[i], a1[i]) differing only by the target qubit
+
+    :param a0: amplitudes where the target qubit is |0>
+    :param a1: amplitudes where the target qubit is |1> (same shape)
+    :param mat: 2x2 gate matrix
+    :param structure: structure of the gate matrix (see apply_gate)
+    """
+
+    if structure == "diagonal":
+        _apply_diagonal(a0, a1, mat)
+    elif structure == "permutation" and mat[0, 0] == 0:
+        _apply_permutation(a0, a1, mat)
+    else:
+        _apply_dense(a0, a1, mat)
+
+
+def apply_gate(tensor: np.ndarray, mat: np.ndarray, qubit: int, size: int, structure: str = "dense") -> None:
+    """
+    Apply a 2x2 gate in place on the given qubit.
+
+    :param tensor: amplitudes tensor (see as_tensor)
+    :param mat: 2x2 gate matrix
+    :param qubit: index of the circuit line (from top to bottom)
+    :param size: number of qubits of the tensor
+    :param structure: structure of the gate matrix ('diagonal', 'permutation' or 'dense', see gates.get_structure)
+    """
+
+    apply_pair(tensor[_axis(size, qubit, 0)], tensor[_axis(size, qubit, 1)], mat, structure)
+
+
+def apply_controlled_gate(tensor: np.ndarray, mat: np.ndarray, control: int, target: int, size: int,
+                          structure: str = "dense") -> None:
+    """
+    Apply a controlled 2x2 gate in place (gate applied on target where control is |1>).
+
+    :param tensor: amplitudes tensor (see as_tensor)
+    :param mat: 2x2 gate matrix (target)
+    :param control: control line index
+    :param target: target line index
+    :param size: number of qubits of the tensor
+    :param structure: structure of the gate matrix (see apply_gate)
+    """
+
+    # Sub-tensor where the control qubit is |1> (a view, so writes go to the original amplitudes)
+    sub = tensor[_axis(size, control, 1)]
+
+    # The control axis is gone from the sub-tensor
+    if target > control:
+        target -= 1
+
+    apply_gate(sub, mat, target, size - 1, structure)
+
+
+def apply_operation(tensor: np.ndarray, gate, index: int or list or tuple, size: int) -> None:
+    """
+    Apply a circuit operation, as stored by circuit.add_gate, in place.
+
+    :param tensor: amplitudes tensor (see as_tensor)
+    :param gate: Gate object
+    :param index: line index for simple gates, (control, target) for complex gates
+    :param size: number of qubits of the tensor
+    """
+
+    if profiler.enabled:
+        name = gate.name or "fused"
+        profiler.count("gate " + name)
+
+        with profiler.span("contraction", gate=name, index=str(index), structure=gate.structure):
+            _apply_operation(tensor, gate, index, size)
+    else:
+        _apply_operation(tensor, gate, index, size)
+
+
+def _apply_operation(tensor: np.ndarray, gate, index: int or list or tuple, size: int) -> None:
+    """ See apply_operation """
+
+    mat = gate.matrix(tensor.dtype)
+
+    if type(index) is int:
+        apply_gate(tensor, mat, index, size, gate.structure)
+    else:
+        apply_controlled_gate(tensor, mat, index[0], index[1], size, gate.structure)
+
+
+def check_cancel(cancel) -> None:
+    """ Raise SimulationCancelled if the given cancel event (threading.Event or None) is set """
+    if cancel is not None and cancel.is_set():
+        raise SimulationCancelled()
+
+
+def evolve(state: np.ndarray, operations: list, size: int, cancel=None, dtype=np.complex128) -> np.ndarray:
+    """
+    Evolve a state through a list of operations.
+
+    :param state: initial amplitudes (not modified)
+    :param operations: list of (gate, index, column) operations
+    :param size: number of qubits
+    :param cancel: threading.Event checked between gates, the simulation is cancelled once set
+    :param dtype: amplitudes dtype (complex64 or complex128)
+
+    :return: final amplitudes
+    """
+
+    state = np.array(state, dtype=dtype)
+    tensor = as_tensor(state, size)
+
+    for gate, index, _ in operations:
+        check_cancel(cancel)
+        apply_operation(tensor, gate, index, size)
+
+    return state
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from benchmark import random_records
+from qcs import build_circuit
+
+
+"""
+
+Every backend against the 'dense' backend, which keeps the original full matrix semantics (kron products of the
+gates of each column, see circuit._dense_operator).
+
+"""
+
+cases = [(size, mix, seed) for size in range(1, 7) for mix in ("simple", "mixed", "controlled") for seed in range(2)]
+
+
+def build(size: int, records: list, backend: str, **options):
+    """ Circuit simulated by the backend itself (no stabilizer tableau dispatch) """
+    CIRCUIT = build_circuit(size, records, backend=backend, **options)
+    CIRCUIT.stabilizer_dispatch = False
+    return CIRCUIT
+
+
+def random_state(size: int, rng) -> np.ndarray:
+    state = rng.normal(size=2 ** size) + 1j * rng.normal(size=2 ** size)
+    return state / np.linalg.norm(state)
+
+
+@pytest.mark.parametrize("size, mix, seed", cases)
+@pytest.mark.parametrize("backend", ["statevector", "sparse"])
+def test_backend_matches_dense(backend, size, mix, seed):
+    rng = np.random.default_rng(seed)
+    records = random_records(size, mix, seed)
+    initial_state, bra = random_state(size, rng), random_state(size, rng)
+
+    for options in ({}, {"initial_state": initial_state}):
+        expected = build(size, records, "dense", **options)
+        actual = build(size, records, backend, **options)
+
+        np.testing.assert_allclose(actual.get_probabilities(), expected.get_probabilities(), atol=1e-12)
+        np.testing.assert_allclose(actual.get_statevector(), expected.get_statevector(), atol=1e-12)
+        assert actual.make_measurement(bra) == pytest.approx(expected.make_measurement(bra), abs=1e-12)
+
+
+@pytest.mark.parametrize("size, mix, seed", cases)
+def test_exact_mps_matches_dense(size, mix, seed):
+    records = random_records(size, mix, seed)
+    bitstrings = [format(i, "0{}b".format(size)) for i in range(2 ** size)]
+
+    expected = build(size, records, "dense").get_probabilities()
+    # No truncation: bonds up to 2^(n/2), nothing cut off
+    actual = build(size, records, "mps", truncation=(2 ** size, 0.))
+
+    np.testing.assert_allclose(actual.get_probabilities(), expected, atol=1e-12)
+    np.testing.assert_allclose(actual.get_probabilities(bitstrings), expected, atol=1e-12)
+    assert actual.get_truncation_error() == pytest.approx(0, abs=1e-12)
+
+
+@pytest.mark.parametrize("size, mix, seed", cases)
+def test_single_precision_matches_dense(size, mix, seed):
+    records = random_records(size, mix, seed)
+
+    expected = build(size, records, "dense").get_probabilities()
+    actual = build(size, records, "statevector", precision="single").get_probabilities()
+
+    assert actual.dtype == np.float32
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+
+def test_unitary_matches_dense():
+    records = random_records(4, "controlled", 0)
+    initial_state = random_state(4, np.random.default_rng(0))
+
+    expected = build(4, records, "dense", initial_state=initial_state).get_statevector()
+    CIRCUIT = build(4, records, "statevector", initial_state=initial_state)
+    CIRCUIT.get_unitary()
+
+    np.testing.assert_allclose(CIRCUIT.get_statevector(), expected, atol=1e-12)
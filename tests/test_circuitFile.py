@@ -0,0 +1,80 @@
+import pytest
+
+import circuitFile
+from benchmark import random_records
+
+
+"""
+
+Circuit files: round trips of every format, and invalid files.
+
+"""
+
+records = [("H", 0, 0, None), ("CX", 300, 299, 0), ("CZ", 70000, 1, 298), ("sqrt", 70000, 0, None)]
+
+
+@pytest.mark.parametrize("extension", [".json", ".jsonl", ".qcb"])
+def test_round_trip(tmp_path, extension):
+    path = str(tmp_path / ("circuit" + extension))
+
+    circuitFile.save(path, 300, records)
+    assert circuitFile.load(path) == (300, records)
+
+
+@pytest.mark.parametrize("extension", [".jsonl", ".qcb"])
+def test_multi_circuit_files(tmp_path, extension):
+    path = str(tmp_path / ("circuits" + extension))
+    circuits = [(size, random_records(size, "controlled", size)) for size in range(1, 8)]
+
+    with circuitFile.CircuitWriter(path) as writer:
+        for size, gates in circuits:
+            writer.write(size, gates)
+
+    assert list(circuitFile.iter_circuits(path)) == circuits
+
+
+def test_version_1_files(tmp_path):
+    header, gate, _ = circuitFile._layouts[1]
+    path = tmp_path / "old.qcb"
+    path.write_bytes(circuitFile.MAGIC + bytes([1]) + header.pack(2, 2) + gate.pack(5, 0, 0, 255) +
+                     gate.pack(7, 1, 1, 0))
+
+    assert circuitFile.load(str(path)) == (2, [("H", 0, 0, None), ("CX", 1, 1, 0)])
+
+
+@pytest.mark.parametrize("size, gates", [
+    (2, [("H", 0, 5, None)]),
+    (2, [("CX", 0, 1, 1)]),
+    (2, [("H", 0, 1, None), ("X", 0, 1, None)]),
+    (3, [("CX", 0, 1, 0), ("X", 0, 0, None)]),
+    (2, [("CX", 0, 1, None)]),
+    (2, [("H", 0, 1, 0)]),
+    (2, [("T", 0, 1, None)]),
+    (2, [("H", -1, 1, None)]),
+    (0, []),
+])
+def test_invalid_circuits(tmp_path, size, gates):
+    with pytest.raises(ValueError):
+        circuitFile.from_dict({"size": size, "gates": [{"gate": name, "column": column, "target": target,
+                                                        "control": control}
+                                                       for name, column, target, control in gates]})
+
+    with pytest.raises(ValueError):
+        circuitFile.save(str(tmp_path / "circuit.qcb"), size, gates)
+
+
+def test_invalid_binary_files(tmp_path):
+    # Beyond the packed fields
+    with pytest.raises(ValueError):
+        circuitFile.pack(70000, [])
+
+    path = tmp_path / "circuit.qcb"
+    circuitFile.save(str(path), 300, records)
+    data = path.read_bytes()
+
+    corrupted = [data[:7], data[:9], data[:-3], b"QC", b"QCSB", b"QCSB\x07", data[:11] + bytes([99]) + data[12:]]
+
+    for content in corrupted:
+        path.write_bytes(content)
+        with pytest.raises(ValueError):
+            list(circuitFile.iter_circuits(str(path)))
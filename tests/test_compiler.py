@@ -0,0 +1,85 @@
+import random
+
+import numpy as np
+import pytest
+
+from benchmark import random_records, simple_gates
+from cache import PrefixCache
+from compiler import compile_circuit, compile_operations
+from qcs import build_circuit
+from statevector import evolve
+
+
+"""
+
+Compilation passes and the prefix cache against the serial kernels on the source gates.
+
+"""
+
+
+def amplitudes(CIRCUIT) -> np.ndarray:
+    return evolve(CIRCUIT.get_initial_state(), CIRCUIT.operations, CIRCUIT.size)
+
+
+@pytest.mark.parametrize("size", range(1, 7))
+@pytest.mark.parametrize("mix", ["simple", "mixed", "controlled"])
+def test_compiled_matches_source(size, mix):
+    for seed in range(5):
+        CIRCUIT = build_circuit(size, random_records(size, mix, seed))
+        CIRCUIT.stabilizer_dispatch = False
+        compiled, removed = compile_circuit(CIRCUIT)
+
+        assert len(compiled.operations) + removed <= len(CIRCUIT.operations)
+        np.testing.assert_allclose(amplitudes(compiled), amplitudes(CIRCUIT), atol=1e-12)
+
+
+def test_gates_merge_across_columns():
+    records = [("H", 0, 0, None), ("S", 0, 1, None), ("H", 1, 0, None), ("S", 1, 1, None),
+               ("S", 2, 1, None), ("S", 3, 1, None)]
+    CIRCUIT = build_circuit(2, records)
+
+    spans = []
+    operations, removed = compile_operations(CIRCUIT.operations, 2, spans)
+
+    assert operations == [] and removed == 6
+    assert (0, 1) in spans
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_prefix_cache_matches_serial(seed):
+    rng = random.Random(seed)
+    size = rng.randint(2, 7)
+    records = random_records(size, "mixed", seed)
+    cache = PrefixCache(compile=compile_operations)
+
+    for edit in range(8):
+        if edit:
+            i = rng.randrange(len(records))
+            _, column, target, control = records[i]
+            if control is None:
+                records[i] = (rng.choice(simple_gates), column, target, None)
+
+        CIRCUIT = build_circuit(size, records)
+        expected = amplitudes(CIRCUIT)
+        CIRCUIT.set_prefix_cache(cache)
+
+        np.testing.assert_allclose(CIRCUIT.get_statevector(), expected, atol=1e-12)
+        # Kept states are those of the source columns
+        for (column, _), state in zip(cache.keys, cache.states):
+            if state is not None:
+                prefix = [operation for operation in CIRCUIT.operations if operation[2] <= column]
+                np.testing.assert_allclose(state, evolve(CIRCUIT.get_initial_state(), prefix, size), atol=1e-12)
+
+
+def test_prefix_cache_reuses_columns():
+    records = random_records(5, "controlled", 0)
+    cache = PrefixCache(compile=compile_operations)
+
+    CIRCUIT = build_circuit(5, records)
+    CIRCUIT.set_prefix_cache(cache)
+    CIRCUIT.get_statevector()
+    assert cache.reused_columns == 0
+
+    # Same circuit again: resumed from the last kept state
+    CIRCUIT.get_statevector()
+    assert cache.reused_columns == max(i + 1 for i, state in enumerate(cache.states) if state is not None)
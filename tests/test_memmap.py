@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import memmapState
+from benchmark import random_records
+from qcs import build_circuit
+from statevector import evolve
+
+
+"""
+
+Memory mapped statevector (see memmapState.py) against the serial kernels.
+
+"""
+
+cases = [(size, mix) for size in (1, 3, 5, 8) for mix in ("simple", "mixed", "controlled")]
+
+
+@pytest.mark.parametrize("size, mix", cases)
+@pytest.mark.parametrize("chunk", [1, 2, 4])
+def test_blocks_match_serial(tmp_path, size, mix, chunk):
+    rng = np.random.default_rng(size)
+    initial_state = rng.normal(size=2 ** size) + 1j * rng.normal(size=2 ** size)
+    initial_state /= np.linalg.norm(initial_state)
+    CIRCUIT = build_circuit(size, random_records(size, mix, seed=size))
+    path = str(tmp_path / "state.amplitudes")
+
+    for initial in (None, initial_state):
+        start = CIRCUIT.get_initial_state() if initial is None else initial
+        expected = evolve(start, CIRCUIT.operations, size)
+
+        state = memmapState.evolve(path, initial, CIRCUIT.operations, size, chunk=chunk)
+        np.testing.assert_allclose(state, expected, atol=1e-12)
+
+        chunks = list(memmapState.iter_probabilities(state, chunk))
+        assert [start for start, _ in chunks] == list(range(0, 2 ** size, 2 ** chunk))
+        np.testing.assert_allclose(np.concatenate([p for _, p in chunks]), np.abs(expected) ** 2, atol=1e-12)
+        del state
+
+
+@pytest.mark.parametrize("precision", ["double", "single"])
+def test_circuit_storage_matches_memory(tmp_path, precision):
+    size = 7
+    records = random_records(size, "controlled", seed=3)
+    states = ["0" * size, "1" * size]
+
+    expected = build_circuit(size, records, precision=precision)
+    CIRCUIT = build_circuit(size, records, storage=str(tmp_path / "state.amplitudes"), precision=precision)
+
+    atol = 1e-12 if precision == "double" else 1e-6
+    probabilities = CIRCUIT.get_probabilities()
+    assert probabilities.dtype == expected.get_probabilities().dtype
+    np.testing.assert_allclose(probabilities, expected.get_probabilities(), atol=atol)
+    np.testing.assert_allclose(CIRCUIT.get_probabilities(states), expected.get_probabilities(states), atol=atol)
+
+    counts = np.concatenate([c for _, c in CIRCUIT.iter_state_counts(1000, chunk=3, seed=0)])
+    assert counts.sum() == 1000
+    assert np.all(counts[probabilities < 1e-12] == 0)
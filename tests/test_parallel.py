@@ -0,0 +1,89 @@
+import threading
+
+import numpy as np
+import pytest
+
+import parallelState
+from benchmark import random_records
+from qcs import build_circuit
+from statevector import evolve, as_tensor, SimulationCancelled
+
+
+"""
+
+Multi-process statevector (see parallelState.py) against the serial kernels.
+
+"""
+
+cases = [(size, mix) for size in (2, 3, 4, 6, 9) for mix in ("simple", "mixed", "controlled")]
+
+
+def serial(size: int, records: list, initial_state: np.ndarray = None) -> tuple:
+    """ (operations, final amplitudes of the serial kernels) """
+    CIRCUIT = build_circuit(size, records, initial_state=initial_state)
+    return CIRCUIT.operations, evolve(CIRCUIT.get_initial_state(), CIRCUIT.operations, size)
+
+
+@pytest.mark.parametrize("size, mix", cases)
+@pytest.mark.parametrize("partition", [1, 2, 3])
+def test_partitioned_gates_match_serial(size, mix, partition):
+    # Workers run one after the other, the loop over the ranks standing for the barrier after each gate
+    partition = min(partition, size - 2)
+    operations, expected = serial(size, random_records(size, mix, seed=size))
+
+    state = np.zeros(2 ** size, dtype=np.complex128)
+    state[0] = 1
+    segments = as_tensor(state.reshape(2 ** partition, -1), size - partition)
+
+    for gate, index, _ in operations:
+        for rank in range(2 ** partition):
+            parallelState.apply_partitioned(segments, gate, index, partition, rank)
+
+    np.testing.assert_allclose(state, expected, atol=1e-12)
+
+
+@pytest.mark.parametrize("size, mix", [(4, "controlled"), (9, "mixed")])
+@pytest.mark.parametrize("processes", [1, 2, 4, 8])
+def test_processes_match_serial(size, mix, processes):
+    rng = np.random.default_rng(size)
+    initial_state = rng.normal(size=2 ** size) + 1j * rng.normal(size=2 ** size)
+    initial_state /= np.linalg.norm(initial_state)
+    records = random_records(size, mix, seed=size)
+
+    operations, expected = serial(size, records)
+    np.testing.assert_allclose(parallelState.evolve(None, operations, size, processes), expected, atol=1e-12)
+
+    single = parallelState.evolve(None, operations, size, processes, dtype=np.complex64)
+    assert single.dtype == np.complex64
+    np.testing.assert_allclose(single, expected, atol=1e-5)
+
+    operations, expected = serial(size, records, initial_state)
+    np.testing.assert_allclose(parallelState.evolve(initial_state, operations, size, processes), expected,
+                               atol=1e-12)
+
+
+def test_circuit_results_read_from_shared_block():
+    size = 8
+    records = random_records(size, "controlled", seed=1)
+    rng = np.random.default_rng(1)
+    bra = rng.normal(size=2 ** size) + 1j * rng.normal(size=2 ** size)
+    states = ["0" * size, "1" * size, "01" * (size // 2)]
+
+    expected = build_circuit(size, records)
+    CIRCUIT = build_circuit(size, records)
+    CIRCUIT.set_processes(4)
+
+    np.testing.assert_allclose(CIRCUIT.get_probabilities(), expected.get_probabilities(), atol=1e-12)
+    np.testing.assert_allclose(CIRCUIT.get_probabilities(states), expected.get_probabilities(states), atol=1e-12)
+    np.testing.assert_allclose(CIRCUIT.get_statevector(), expected.get_statevector(), atol=1e-12)
+    assert CIRCUIT.make_measurement(bra) == pytest.approx(expected.make_measurement(bra), abs=1e-12)
+
+
+def test_cancelled():
+    size = 9
+    operations, _ = serial(size, random_records(size, "mixed", seed=0))
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(SimulationCancelled):
+        parallelState.evolve(None, operations, size, 4, cancel=cancel)
@@ -0,0 +1,140 @@
+import io
+import random
+
+import numpy as np
+import pytest
+
+import circuitFile
+import qcs
+import stabilizer
+from compiler import compile_circuit
+from qcs import build_circuit
+
+
+"""
+
+Stabilizer tableau against the statevector kernels, on random Clifford circuits.
+
+"""
+
+simple_gates = ("I", "X", "Y", "Z", "S", "H", "sqrt")
+complex_gates = ("CX", "CY", "CZ")
+
+
+def clifford_records(size: int, seed: int, depth: int = 8) -> list:
+    """ Random Clifford gate records, one gate at most per line and column """
+
+    rng = random.Random(seed)
+    records = []
+
+    for column in range(depth):
+        free = list(range(size))
+        rng.shuffle(free)
+
+        while free:
+            line = free.pop()
+            if free and rng.random() < 0.4:
+                records.append((rng.choice(complex_gates), column, line, free.pop()))
+            else:
+                records.append((rng.choice(simple_gates), column, line, None))
+
+    return records
+
+
+def amplitudes(size: int, records: list):
+    """ Circuit simulated on its amplitudes """
+    CIRCUIT = build_circuit(size, records)
+    CIRCUIT.stabilizer_dispatch = False
+    return CIRCUIT
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_tableau_matches_statevector(seed):
+    size = 1 + seed % 7
+    records = clifford_records(size, seed)
+
+    expected = amplitudes(size, records).get_probabilities()
+    CIRCUIT = build_circuit(size, records)
+    assert CIRCUIT.uses_stabilizer()
+
+    np.testing.assert_allclose(CIRCUIT.get_probabilities(), expected, atol=1e-12)
+
+    tableau = CIRCUIT.get_tableau()
+    bitstrings = [format(i, "0{}b".format(size)) for i in range(2 ** size)]
+    np.testing.assert_allclose([tableau.probability(b) for b in bitstrings], expected, atol=1e-12)
+    assert sorted(tableau.outcome_indices()) == list(np.flatnonzero(expected > 1e-12))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_samples_in_support(seed):
+    size = 2 + seed % 6
+    records = clifford_records(size, seed)
+
+    expected = amplitudes(size, records).get_probabilities()
+    counts = build_circuit(size, records).get_sparse_counts(4000, seed=seed)
+
+    assert sum(counts.values()) == 4000
+    assert all(expected[i] > 1e-12 for i in counts)
+
+    # Uniform over the outcomes: each count within 6 standard deviations
+    p = expected[list(counts)]
+    assert np.all(np.abs(np.array(list(counts.values())) - 4000 * p) < 6 * np.sqrt(4000 * p) + 1)
+
+
+def test_count_indices_beyond_64_qubits():
+    bits = np.zeros((5, 70), dtype=bool)
+    bits[[1, 3], 0] = True
+    bits[4, 69] = True
+
+    indices, counts = stabilizer.count_indices(bits)
+    assert dict(zip(indices, counts)) == {0: 2, 2 ** 69: 2, 1: 1}
+
+
+def test_wide_ghz_sampling():
+    size = 300
+    records = [("H", 0, 0, None)] + [("CX", line, line, line - 1) for line in range(1, size)]
+
+    counts = build_circuit(size, records).get_sparse_counts(1000, seed=0)
+
+    assert set(counts) == {0, 2 ** size - 1}
+    assert sum(counts.values()) == 1000
+
+
+def test_compilation_keeps_clifford_gates():
+    records = clifford_records(5, 0)
+    CIRCUIT, _ = compile_circuit(build_circuit(5, records))
+
+    assert CIRCUIT.uses_stabilizer()
+    np.testing.assert_allclose(CIRCUIT.get_probabilities(), amplitudes(5, records).get_probabilities(), atol=1e-12)
+
+
+def test_too_many_outcomes_fall_back_to_amplitudes(monkeypatch, tmp_path):
+    # 2^4 equally likely outcomes, above the listing limit
+    monkeypatch.setattr(stabilizer, "max_outcome_bits", 3)
+    records = [("H", 0, line, None) for line in range(4)]
+    CIRCUIT = build_circuit(4, records)
+
+    assert CIRCUIT.uses_stabilizer()
+    assert not CIRCUIT.uses_stabilizer(all_outcomes=True)
+    with pytest.raises(ValueError):
+        CIRCUIT.get_tableau().outcome_indices()
+
+    np.testing.assert_allclose(CIRCUIT.get_probabilities(), np.full(16, 1 / 16))
+
+    path = str(tmp_path / "h4.json")
+    circuitFile.save(path, 4, records)
+    output = io.StringIO()
+    qcs.run(path, output, backend="statevector", top=3)
+    assert [float(line.split()[1]) for line in output.getvalue().splitlines()] == pytest.approx([1 / 16] * 3)
+
+
+def test_dispatch_can_be_disabled(tmp_path):
+    path = str(tmp_path / "ghz.json")
+    circuitFile.save(path, 3, [("H", 0, 0, None), ("CX", 1, 1, 0), ("CX", 2, 2, 1)])
+
+    for dispatch in (True, False):
+        output = io.StringIO()
+        qcs.run(path, output, backend="statevector", stabilizer_dispatch=dispatch)
+        lines = output.getvalue().split()
+        assert lines[0::2] == ["000", "111"]
+        assert [float(v) for v in lines[1::2]] == pytest.approx([0.5, 0.5])
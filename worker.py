@@ -0,0 +1,96 @@
+import threading
+
+from statevector import SimulationCancelled
+
+
+"""
+
+Background simulation worker, so that simulations do not freeze the tkinter main loop.
+
+Only the newest submitted job matters: submitting a job replaces any job still waiting and cancels the one running
+(through its cancel event, see statevector.check_cancel). Results of outdated jobs are dropped. The worker does not
+touch any tkinter object, the GUI collects results from its main loop with poll().
+
+"""
+
+
+class SimulationWorker(object):
+
+    def __init__(self):
+        """ Background simulation thread (a single job runs at a time) """
+
+        self.condition = threading.Condition()
+
+        # Number of the newest submitted job
+        self.generation = 0
+        # Job waiting to be run: (generation, function, cancel event)
+        self.job = None
+        # Cancel event of the newest submitted job
+        self.cancel = None
+        # Newest result not yet collected: (generation, value, error)
+        self.result = None
+
+        self.stopped = False
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, function) -> int:
+        """
+        Submit a new job, replacing/cancelling previous ones.
+
+        :param function: function taking a cancel event (threading.Event) as argument, returning the job result
+        :return: job number
+        """
+
+        with self.condition:
+            if self.cancel is not None:
+                self.cancel.set()
+
+            self.generation += 1
+            self.cancel = threading.Event()
+            self.job = (self.generation, function, self.cancel)
+
+            self.condition.notify()
+            return self.generation
+
+    def poll(self) -> tuple or None:
+        """ Collect the newest result if any, as (job number, value, error) """
+        with self.condition:
+            result, self.result = self.result, None
+            return result
+
+    def stop(self) -> None:
+        """ Cancel current job and stop the thread """
+        with self.condition:
+            self.stopped = True
+            if self.cancel is not None:
+                self.cancel.set()
+            self.condition.notify()
+
+    def _run(self) -> None:
+        """ Thread loop """
+
+        while True:
+
+            with self.condition:
+                while self.job is None and not self.stopped:
+                    self.condition.wait()
+
+                if self.stopped:
+                    return
+
+                generation, function, cancel = self.job
+                self.job = None
+
+            try:
+                value, error = function(cancel), None
+            except SimulationCancelled:
+                continue
+            except Exception as e:
+                value, error = None, e
+
+            with self.condition:
+                # Only keep the result of the newest job
+                if generation == self.generation:
+                    self.result = (generation, value, error)